@@ -1,38 +1,100 @@
-import torch
-from torch.utils.data import DataLoader
-import torch.nn as nn
-import torch.optim as optim
-from datasets.dataset import HousingDataset
+import numpy as np
+import pandas as pd
+from datasets.dataset import (
+    FEATURE_COLUMNS, normalize_column_name, normalize_columns, encode_feature_row, encode_features
+)
+from database.feature_store import FeatureStore
+from models.customer_profiles import CustomerProfileGenerator
+from models.llm_handler import LISTING_ERROR_PREFIX
+from models.model_handler import INTERVAL_LEVEL
+from models.prediction_cache import PredictionCache
+from monitoring import metrics
+from training.model_training import fit, residual_std, split_dataset
 
 class RealEstateApp:
-    def __init__(self, db_handler, model_handler, llm_handler):
+    def __init__(self, db_handler, model_handler, llm_handler, prediction_cache=None, profile_generator=None,
+                 llm_profiles=False):
+        """
+        :param profile_generator: CustomerProfileGenerator for customer profiles.
+        :param llm_profiles: Generate customer profiles with the LLM instead of the much
+                             faster rule-based profile_generator.
+        """
         self.db_handler = db_handler
         self.model_handler = model_handler
         self.llm_handler = llm_handler
+        # Memoizes predict_price and query_closest_match per property
+        self.prediction_cache = prediction_cache if prediction_cache is not None else PredictionCache()
+        self.profile_generator = profile_generator if profile_generator is not None else CustomerProfileGenerator()
+        self.llm_profiles = llm_profiles
 
-    def train_model(self, data, epochs=10, batch_size=32, lr=0.001):
-        dataset = HousingDataset(data)
-        train_loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-        criterion = nn.MSELoss()
-        optimizer = optim.Adam(self.model_handler.model.parameters(), lr=lr)
-
-        for epoch in range(epochs):
-            for batch_X, batch_y in train_loader:
-                optimizer.zero_grad()
-                predictions = self.model_handler.model(batch_X).squeeze()
-                loss = criterion(predictions, batch_y)
-                loss.backward()
-                optimizer.step()
+    def train_model(self, data, epochs=10, batch_size=32, lr=0.001, val_fraction=0.0):
+        # data is a DataFrame or a FeatureStore, which is trained on in place.
+        # Features and prices are standardized; the scaler is saved with the weights.
+        # The residual spread for prediction intervals is measured on the val_fraction
+        # held out, or on the training rows when nothing is held out
+        scaler, dataset, val_dataset = split_dataset(data, val_fraction=val_fraction)
+        fit(self.model_handler.model, dataset, epochs=epochs, batch_size=batch_size, lr=lr)
+        self.model_handler.scaler = scaler
+        self.model_handler.residual_std = residual_std(self.model_handler.model, val_dataset or dataset,
+                                                       scaler.target_std)
         self.model_handler.save_model()
 
+    @metrics.timed("predict_price")
     def predict_price(self, *inputs):
-        inputs_processed = [
-            float(inputs[i]) if i != 3 else 1.0 if inputs[i] == "Y" else 0.0
-            for i in range(len(inputs))
-        ]
-        inputs_tensor = torch.tensor([inputs_processed], dtype=torch.float32)
-        price = self.model_handler.model(inputs_tensor).item()
-        return f"Estimated Price: ${price:,.2f}"
+        estimate = self._price_estimate(inputs)
+        if estimate["upper"] == estimate["lower"]:
+            # No spread was measured for this model
+            return f"Estimated Price: ${estimate['price']:,.2f}"
+        return (f"Estimated Price: ${estimate['price']:,.2f} "
+                f"({INTERVAL_LEVEL:.0%} interval: ${estimate['lower']:,.2f} - ${estimate['upper']:,.2f})")
+
+    def _predicted_price(self, inputs):
+        return self._price_estimate(inputs)["price"]
+
+    def _price_estimate(self, inputs):
+        # Cached until the model handler serves new weights
+        def compute():
+            X = np.array([encode_feature_row(inputs)], dtype=np.float32)
+            return {key: float(values[0]) for key, values in self.model_handler.predict_interval(X).items()}
+        return self.prediction_cache.get_or_compute(
+            PredictionCache.make_key("predict_price", inputs), self.model_handler.version, compute,
+        )
+
+    @metrics.timed("predict_prices")
+    def predict_prices(self, data, batch_size=65536):
+        """
+        Predict sale prices for many properties at once.
+        :param data: A DataFrame, a path to a CSV file, a FeatureStore (read in place), or an
+                     array of shape (n, 7) with the features in the order (lot_area,
+                     overall_quality, overall_condition, central_air, full_bath, bedrooms,
+                     garage_cars).
+        :param batch_size: Number of rows per forward pass.
+        :return: A float32 NumPy array with one price per row.
+        """
+        return self.model_handler.predict(self._encode(data), batch_size=batch_size)
+
+    @metrics.timed("predict_price_intervals")
+    def predict_price_intervals(self, data, level=INTERVAL_LEVEL, batch_size=65536):
+        """
+        Predict sale prices with prediction intervals for many properties at once.
+        :param data: A DataFrame, a CSV path, a FeatureStore or an array of shape (n, 7), as for predict_prices.
+        :param level: Probability that a sale price falls inside its interval.
+        :return: A DataFrame with one row per property and the columns price (the ensemble
+                 mean), std, lower and upper, see ModelHandler.predict_interval.
+        """
+        return pd.DataFrame(self.model_handler.predict_interval(self._encode(data), level=level, batch_size=batch_size))
+
+    def _encode(self, data):
+        if isinstance(data, FeatureStore):
+            return data.X
+        if isinstance(data, str):
+            data = pd.read_csv(data, usecols=lambda col: normalize_column_name(col) in FEATURE_COLUMNS)
+        if isinstance(data, pd.DataFrame):
+            return encode_features(normalize_columns(data.copy(deep=False)))
+        data = np.asarray(data)
+        if data.ndim != 2 or data.shape[1] != len(FEATURE_COLUMNS):
+            raise ValueError(f"Expected an array of shape (n, {len(FEATURE_COLUMNS)}), but got {data.shape}.")
+        return encode_features(pd.DataFrame(data, columns=FEATURE_COLUMNS))
 
     def record_price(self, *inputs):
         try:
@@ -44,25 +106,60 @@ class RealEstateApp:
     def copy_values(self, *args):
         return args
 
+    @metrics.timed("query_closest_match")
     def query_closest_match(self, *inputs):
-        result = self.db_handler.get_closest_match(inputs)
+        # Cached until the properties table changes
+        result = self.prediction_cache.get_or_compute(
+            PredictionCache.make_key("query_closest_match", inputs), self.db_handler.version,
+            lambda: self.db_handler.get_closest_match(inputs),
+        )
         return f"Closest Match: {result}" if result else "No match found."
 
     def generate_listing(self, *inputs):
+        """
+        Stream a generated listing, yielding the text produced so far.
+        The listing is recorded once it is complete.
+        """
         features, description = inputs[:-1], inputs[-1]
-        full_data = self.db_handler.get_full_data_for_features(features)
-        listing = self.llm_handler.generate_listing_llm(full_data, description)
-        self.db_handler.record_listing(listing)
-        return listing
+        # Named columns, so the prompt can be compacted to the fields that matter
+        full_data = self.db_handler.get_full_data_for_features(features, as_dict=True)
+        listing = ""
+        for listing in self.llm_handler.stream_listing_llm(full_data, description):
+            yield listing
+        # Recorded under its prompt key so the LLM response cache can find it again
+        prompt_key = None
+        if not listing.startswith(LISTING_ERROR_PREFIX):
+            prompt_key = self.llm_handler.listing_cache_key(full_data, description)
+        self.db_handler.record_listing(listing, prompt_key=prompt_key)
 
     def record_feedback(self, listing, feedback):
         try:
-            self.db_handler.record_feedback(listing, feedback)
+            # Only reported as recorded once the batched write has committed it
+            self.db_handler.record_feedback(listing, feedback).result()
             return "Feedback recorded successfully!"
         except Exception as e:
             return f"Error recording feedback: {str(e)}"
 
+    @metrics.timed("generate_customer_profiles")
     def generate_customer_profiles(self, *inputs):
-        full_data = self.db_handler.get_full_data_for_features(inputs)
-        profiles = self.llm_handler.generate_listing_llm(full_data,description="")
-        return profiles
+        if self.llm_profiles:
+            full_data = self.db_handler.get_full_data_for_features(inputs, as_dict=True)
+            return self.llm_handler.generate_listing_llm(full_data, description="")
+        # Profiles are conditioned on the features and the predicted price
+        X = np.array([encode_feature_row(inputs)])
+        profiles = self.profile_generator.generate(X, [self._predicted_price(inputs)])
+        return self.profile_generator.format(profiles)
+
+    @metrics.timed("generate_customer_profiles_bulk")
+    def generate_customer_profiles_bulk(self, data, n=None, prices=None):
+        """
+        Generate customer profiles for many properties at once.
+        :param data: A DataFrame, a CSV path, a FeatureStore or an array of shape (m, 7), as for predict_prices.
+        :param n: Profiles per property, by default the profile generator's profiles_per_property.
+        :param prices: Price of each property; predicted with the model when omitted.
+        :return: A DataFrame of profiles, see CustomerProfileGenerator.generate.
+        """
+        X = self._encode(data)
+        if prices is None:
+            prices = self.model_handler.predict(X)
+        return self.profile_generator.generate(X, prices, n=n)
@@ -0,0 +1,55 @@
+"""
+Compare rows/sec of RealEstateApp.predict_prices against calling predict_price in a loop.
+
+Usage: python -m benchmarks.bench_bulk_predict [--rows N]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.real_state_app import RealEstateApp
+from datasets.dataset import FEATURE_COLUMNS, normalize_columns
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+
+
+def load_features(data_path, rows):
+    data = normalize_columns(pd.read_csv(data_path))[FEATURE_COLUMNS]
+    repeats = -(-rows // len(data))
+    return pd.concat([data] * repeats, ignore_index=True).iloc[:rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--loop-rows", type=int, default=2_000, help="Rows used for the predict_price loop")
+    args = parser.parse_args()
+
+    model_handler = ModelHandler(SalePriceModel(), model_path=None)
+    app = RealEstateApp(None, model_handler, None)
+    data = load_features(args.data, args.rows)
+
+    loop_rows = [tuple(row) for row in data.head(args.loop_rows).itertuples(index=False)]
+    start = time.perf_counter()
+    for row in loop_rows:
+        app.predict_price(*row)
+    loop_rate = len(loop_rows) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    prices = app.predict_prices(data)
+    bulk_rate = len(data) / (time.perf_counter() - start)
+
+    # Both paths must agree on the rows they share
+    single = np.array([float(app.predict_price(*row).split("$")[1].replace(",", "")) for row in loop_rows[:100]])
+    np.testing.assert_allclose(prices[:len(single)], single, rtol=1e-4, atol=0.01)
+
+    print(f"predict_price loop: {loop_rate:,.0f} rows/sec ({len(loop_rows):,} rows)")
+    print(f"predict_prices:     {bulk_rate:,.0f} rows/sec ({len(data):,} rows)")
+    print(f"speedup:            {bulk_rate / loop_rate:,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
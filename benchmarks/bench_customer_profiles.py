@@ -0,0 +1,76 @@
+"""
+Latency of RealEstateApp.generate_customer_profiles through the GPT-2 path (here a
+tiny random local model, so real GPT-2 is far slower) and through the rule-based
+CustomerProfileGenerator, and throughput of generate_customer_profiles_bulk.
+
+Usage: python -m benchmarks.bench_customer_profiles [--requests N] [--properties N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.real_state_app import RealEstateApp
+from benchmarks.tiny_llm import build_tiny_llm
+from database.init_db import DatabaseHandler
+from datasets.dataset import FEATURE_COLUMNS, normalize_columns
+from models.llm_handler import LLMHandler
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from models.prediction_cache import PredictionCache
+from models.response_cache import ResponseCache
+
+
+def mean_ms(fn, queries):
+    fn(*queries[0])
+    start = time.perf_counter()
+    for features in queries:
+        fn(*features)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--properties", type=int, default=100_000)
+    args = parser.parse_args()
+
+    data = normalize_columns(pd.read_csv(args.data))
+    rng = np.random.default_rng(0)
+    sample = data[FEATURE_COLUMNS].iloc[rng.integers(0, len(data), args.properties)].reset_index(drop=True)
+    queries = [tuple(row) for row in sample.head(args.requests).itertuples(index=False)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler = DatabaseHandler(os.path.join(tmp, "bench.db"))
+        db_handler.initialize_database(args.data)
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "model.pth"))
+        model, tokenizer = build_tiny_llm()
+        # Caches disabled, so every request generates its profiles
+        llm_handler = LLMHandler(model=model, tokenizer=tokenizer, cache=ResponseCache(max_size=0))
+        apps = {
+            "llm": RealEstateApp(db_handler, model_handler, llm_handler, PredictionCache(max_size=0), llm_profiles=True),
+            "rules": RealEstateApp(db_handler, model_handler, llm_handler, PredictionCache(max_size=0)),
+        }
+        latency = {name: mean_ms(app.generate_customer_profiles, queries) for name, app in apps.items()}
+
+        print(f"{'path':>6} {'ms/request':>11}")
+        for name, ms in latency.items():
+            print(f"{name:>6} {ms:11.2f}")
+        print(f"rule-based is {latency['llm'] / latency['rules']:.0f}x faster than the tiny LLM")
+
+        app = apps["rules"]
+        start = time.perf_counter()
+        profiles = app.generate_customer_profiles_bulk(sample)
+        seconds = time.perf_counter() - start
+        print(f"bulk: {len(profiles):,} profiles for {args.properties:,} properties in {seconds * 1000:.0f} ms "
+              f"({len(profiles) / seconds:,.0f} profiles/s)")
+        print(profiles["interest"].value_counts(normalize=True).round(3).to_dict())
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Writes per second and concurrent read latency of DatabaseHandler under many
+simultaneous users: writer threads record listings and feedback while reader
+threads query closest matches.
+
+Compared against the previous layout, one shared connection with a commit per row
+(emulated here), to show the effect of per-thread readers and batched writes.
+
+Usage: python -m benchmarks.bench_db_concurrency [--writers N] [--readers N] [--duration S] [--durable]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from database.init_db import DatabaseHandler
+
+FEATURES = (8450, 7, 5, "Y", 2, 3, 2)
+
+
+class SharedConnectionHandler:
+    """The previous write path: a single shared connection and one commit per row."""
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self.conn = sqlite3.connect(db_handler.db_name, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+
+    def record_listing(self, listing, prompt_key=None):
+        self.conn.execute(
+            "INSERT INTO listings (description, prompt_key, created_at) VALUES (?, ?, ?)",
+            (listing, prompt_key, time.time()),
+        )
+        self.conn.commit()
+
+    def record_feedback(self, listing, feedback):
+        self.conn.execute("INSERT INTO feedback (listing, feedback) VALUES (?, ?)", (listing, feedback))
+        self.conn.commit()
+
+    def get_closest_match(self, inputs):
+        return self.db_handler.get_closest_match(inputs)
+
+    def flush(self):
+        pass
+
+
+def run(handler, writers, readers, duration, think_time, durable):
+    deadline = time.perf_counter() + duration
+    writes, errors = [0] * writers, [0] * (writers + readers)
+    read_latencies = [[] for _ in range(readers)]
+
+    def writer(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            try:
+                if n % 2:
+                    future = handler.record_feedback(f"listing {i}-{n}", "Thumbs Up")
+                else:
+                    future = handler.record_listing(f"listing {i}-{n}", prompt_key=f"{i}-{n}")
+                # Optionally each simulated user waits until its write is committed
+                if durable and future is not None:
+                    future.result()
+                writes[i] += 1
+            except sqlite3.Error:
+                errors[i] += 1
+            n += 1
+            time.sleep(think_time)
+
+    def reader(i):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                handler.get_closest_match(FEATURES)
+                read_latencies[i].append(time.perf_counter() - start)
+            except sqlite3.Error:
+                errors[writers + i] += 1
+            time.sleep(think_time)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    handler.flush()
+    elapsed = time.perf_counter() - start
+    latencies = np.concatenate([np.array(values) for values in read_latencies]) * 1000
+    return sum(writes) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99), sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--think-time", type=float, default=0.001, help="Seconds each simulated user pauses between requests")
+    parser.add_argument("--durable", action="store_true", help="Writers wait for each write to be committed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler = DatabaseHandler(os.path.join(tmp, "bench.db"))
+        db_handler.initialize_database(args.data)
+        handlers = {"shared connection": SharedConnectionHandler(db_handler), "pool + batched writer": db_handler}
+
+        print(f"{args.writers} writer threads, {args.readers} reader threads, {args.duration:.0f}s each")
+        print(f"{'layout':>22} {'writes/s':>10} {'read p50 ms':>12} {'read p99 ms':>12} {'errors':>7}")
+        for label, handler in handlers.items():
+            writes, p50, p99, errors = run(handler, args.writers, args.readers, args.duration, args.think_time, args.durable)
+            print(f"{label:>22} {writes:10,.0f} {p50:12.2f} {p99:12.2f} {errors:7d}")
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Inference cost and interval quality of a K-member SalePriceEnsemble, evaluated in one
+stacked forward pass, against a single SalePriceModel and against K separate models
+run one after the other: single-property latency, bulk rows/sec, and the coverage and
+width of the prediction intervals on a held-out split.
+
+Usage: python -m benchmarks.bench_ensemble [--members K] [--rows N] [--epochs N]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from app.real_state_app import RealEstateApp
+from benchmarks.suite import percentiles, time_calls
+from datasets.dataset import FEATURE_COLUMNS, normalize_columns
+from models.model import build_model
+from models.model_handler import INTERVAL_LEVEL, ModelHandler
+from training.model_training import fit, residual_std, split_dataset
+
+
+def train(n_members, train_dataset, val_dataset, scaler, epochs, seed):
+    torch.manual_seed(seed)
+    model = build_model(n_members=n_members)
+    start = time.perf_counter()
+    fit(model, train_dataset, epochs=epochs, batch_size=64)
+    seconds = time.perf_counter() - start
+    handler = ModelHandler(model, model_path=None)
+    handler.scaler = scaler
+    handler.residual_std = residual_std(model, val_dataset, scaler.target_std)
+    return handler, seconds
+
+
+def separate_interval(handlers, X):
+    """
+    The naive ensemble: one forward pass per member model.
+    """
+    members = np.stack([handler.predict(X) for handler in handlers], axis=1)
+    return members.mean(axis=1), members.std(axis=1, ddof=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--members", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows for the bulk prediction timing")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--calls", type=int, default=2_000, help="Single-property predictions timed")
+    args = parser.parse_args()
+
+    data = normalize_columns(pd.read_csv(args.data))
+    scaler, train_dataset, val_dataset = split_dataset(data, val_fraction=0.2)
+    single, single_train = train(1, train_dataset, val_dataset, scaler, args.epochs, seed=0)
+    ensemble, ensemble_train = train(args.members, train_dataset, val_dataset, scaler, args.epochs, seed=0)
+    separate = [train(1, train_dataset, val_dataset, scaler, args.epochs, seed=seed)[0] for seed in range(args.members)]
+
+    features = data[FEATURE_COLUMNS]
+    app = RealEstateApp(None, ensemble, None)
+    X = app._encode(pd.concat([features] * -(-args.rows // len(features)), ignore_index=True).iloc[:args.rows])
+    rows = [(X[i:i + 1],) for i in np.random.default_rng(0).integers(0, len(X), args.calls)]
+    configs = {
+        "single model": lambda X: single.predict_interval(X),
+        f"{args.members} separate models": lambda X: separate_interval(separate, X),
+        f"{args.members}-member ensemble": lambda X: ensemble.predict_interval(X),
+    }
+
+    print(f"Training {args.epochs} epochs: single model {single_train:.1f}s, "
+          f"{args.members}-member ensemble {ensemble_train:.1f}s ({ensemble_train / single_train:.1f}x)")
+    print(f"{'':>22} {'p50 ms':>8} {'p99 ms':>8} {'bulk rows/s':>12} {'vs single':>10}")
+    baseline = None
+    for name, predict in configs.items():
+        latency = percentiles(time_calls(predict, rows))
+        predict(X[:65536])  # warm up
+        start = time.perf_counter()
+        predict(X)
+        rate = len(X) / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{name:>22} {latency['p50_ms']:8.3f} {latency['p99_ms']:8.3f} {rate:12,.0f} {baseline / rate:9.2f}x")
+
+    # Interval quality on the held-out split (its features are still standardized)
+    X_val = val_dataset.X.numpy() * scaler.feature_std.astype(np.float32) + scaler.feature_mean.astype(np.float32)
+    y_val = scaler.inverse_target(val_dataset.y.numpy())
+    print(f"\n{INTERVAL_LEVEL:.0%} intervals on {len(y_val)} held-out sales:")
+    for name, handler in (("single model", single), (f"{args.members}-member ensemble", ensemble)):
+        interval = handler.predict_interval(X_val)
+        covered = np.mean((y_val >= interval["lower"]) & (y_val <= interval["upper"]))
+        rmse = np.sqrt(np.mean((interval["price"] - y_val) ** 2))
+        print(f"{name:>22}: RMSE ${rmse:,.0f}, coverage {covered:.1%}, "
+              f"mean width ${np.mean(interval['upper'] - interval['lower']):,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Time and peak NumPy/pandas memory (tracemalloc) of each consumer of the model columns,
+reading them from SQLite into a DataFrame versus from the memory-mapped FeatureStore:
+loading the training data, building the nearest-neighbour index, one training epoch
+and batch prediction.
+
+Usage: python -m benchmarks.bench_feature_store [--rows N] [--batch-size N]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import torch
+
+from app.real_state_app import RealEstateApp
+from benchmarks.suite import synthetic_csv
+from database.feature_store import FeatureStore
+from database.init_db import DatabaseHandler
+from database.spatial_index import FeatureIndex
+from datasets.dataset import FEATURE_COLUMNS
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from training.model_training import fit, split_dataset
+
+
+def measure(fn):
+    """
+    :return: (result, seconds, peak MiB); tracing slows allocations down, so the time
+             and the peak come from separate calls.
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def index_from_sql(db_handler):
+    rows = pd.read_sql_query(f"SELECT rowid, {', '.join(FEATURE_COLUMNS)}, yrsold FROM properties", db_handler.conn)
+    return FeatureIndex(
+        rows[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64),
+        rows['rowid'].to_numpy(),
+        pd.to_numeric(rows['yrsold'], errors='coerce').to_numpy(),
+    )
+
+
+def train_epoch(data, batch_size):
+    torch.manual_seed(0)
+    _, dataset, _ = split_dataset(data, val_fraction=0.0)
+    fit(SalePriceModel(), dataset, epochs=1, batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "synthetic.csv")
+        synthetic_csv(args.data, csv_path, args.rows)
+        db_handler = DatabaseHandler(os.path.join(tmp, "bench.db"))
+        db_handler.initialize_database(csv_path)
+        os.remove(csv_path)
+        db_handler.feature_store.clear()
+
+        sync_seconds = measure(db_handler.sync_feature_store)[1]
+        frame, *from_frame = measure(db_handler.load_training_data)
+        # Opening an existing store only maps its files
+        store, *from_store = measure(lambda: FeatureStore(db_handler.feature_store.path))
+        results = {"load training data": from_frame + from_store}
+        results["nearest-neighbour index"] = (
+            measure(lambda: index_from_sql(db_handler))[1:] + measure(lambda: FeatureIndex.from_store(store))[1:]
+        )
+        results["training epoch"] = (
+            measure(lambda: train_epoch(frame, args.batch_size))[1:] + measure(lambda: train_epoch(store, args.batch_size))[1:]
+        )
+
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "model.pth"))
+        app = RealEstateApp(db_handler, model_handler, None)
+        app.train_model(store, epochs=1, batch_size=4096)
+        results["batch prediction"] = (
+            measure(lambda: app.predict_prices(frame))[1:] + measure(lambda: app.predict_prices(store))[1:]
+        )
+
+        print(f"{args.rows:,} rows; initial feature store sync from SQLite {sync_seconds:.2f}s, "
+              f"{os.path.getsize(os.path.join(store.path, 'features.bin')) / 2 ** 20:.0f} MiB of features on disk")
+        print(f"{'':>24} {'DataFrame s':>12} {'peak MiB':>9} {'store s':>8} {'peak MiB':>9}")
+        for name, (frame_s, frame_mib, store_s, store_mib) in results.items():
+            print(f"{name:>24} {frame_s:12.2f} {frame_mib:9.1f} {store_s:8.2f} {store_mib:9.1f}")
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Check and time DatabaseHandler.get_full_data_for_features.
+
+1. EXPLAIN QUERY PLAN must show an index search for every feature and no full scan
+   of properties (the script exits with an error otherwise).
+2. Results must match the original seven-way OR query, with ties on the sale year
+   broken by row id.
+3. Latency of the original query vs the indexed one as the table grows.
+
+Usage: python -m benchmarks.bench_full_data_lookup [--sizes 10000 100000 1000000] [--queries N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.init_db import FULL_DATA_QUERY, DatabaseHandler
+from datasets.dataset import FEATURE_COLUMNS
+
+ORIGINAL_QUERY = """
+SELECT * FROM properties
+WHERE lotarea = ? OR overallqual = ? OR overallcond = ? OR centralair = ?
+OR fullbath = ? OR bedroomabvgr = ? OR garagecars = ?
+ORDER BY yrsold DESC, rowid LIMIT 1
+"""
+
+
+def synthetic_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "LotArea": rng.integers(1300, 60000, rows),
+        "OverallQual": rng.integers(1, 11, rows),
+        "OverallCond": rng.integers(1, 11, rows),
+        "CentralAir": rng.choice(["Y", "N"], rows, p=[0.93, 0.07]),
+        "FullBath": rng.integers(0, 4, rows),
+        "BedroomAbvGr": rng.integers(0, 7, rows),
+        "GarageCars": rng.integers(0, 5, rows),
+        "YrSold": rng.integers(2006, 2011, rows),
+        "SalePrice": rng.integers(35000, 750000, rows),
+    }).to_csv(path, index=False)
+
+
+def check_query_plan(db_handler):
+    plan = [row[3] for row in db_handler.conn.execute("EXPLAIN QUERY PLAN " + FULL_DATA_QUERY, (0,) * 7)]
+    full_scans = [step for step in plan if step.startswith("SCAN properties")]
+    searches = [step for step in plan if step.startswith("SEARCH properties USING COVERING INDEX")]
+    if full_scans or len(searches) != len(FEATURE_COLUMNS):
+        raise SystemExit("get_full_data_for_features does not use the feature indexes:\n" + "\n".join(plan))
+
+
+def sample_queries(db_handler, n, seed=0):
+    """Feature tuples where each value either comes from a stored row or matches nothing."""
+    rng = np.random.default_rng(seed)
+    max_rowid = db_handler.conn.execute("SELECT MAX(rowid) FROM properties").fetchone()[0]
+    queries = []
+    for row_id in rng.integers(1, max_rowid + 1, n):
+        row = db_handler.conn.execute(
+            f"SELECT {', '.join(FEATURE_COLUMNS)} FROM properties WHERE rowid = ?", (int(row_id),)
+        ).fetchone()
+        queries.append(tuple(value if rng.random() < 0.3 else -1 for value in row))
+    return queries
+
+
+def median_ms(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'original ms':>12} {'indexed ms':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            csv_path = os.path.join(tmp, f"properties_{size}.csv")
+            synthetic_csv(csv_path, size)
+            db_handler = DatabaseHandler(os.path.join(tmp, f"properties_{size}.db"))
+            db_handler.initialize_database(csv_path)
+            check_query_plan(db_handler)
+
+            queries = sample_queries(db_handler, args.queries)
+            original = lambda features: db_handler.conn.execute(ORIGINAL_QUERY, features).fetchone()
+            for features in queries:
+                if original(features) != db_handler.get_full_data_for_features(features):
+                    raise SystemExit(f"Result differs from the original query for {features}")
+
+            original_ms = median_ms(original, queries)
+            indexed_ms = median_ms(db_handler.get_full_data_for_features, queries)
+            print(f"{size:>10,} {original_ms:12.3f} {indexed_ms:11.3f} {original_ms / indexed_ms:7.0f}x")
+            db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Load test for the UI handler pools: latency of the fast endpoints (predict_price and
+query_closest_match) while concurrent listing generations keep the LLM saturated.
+
+Requests go through the same async handlers Gradio calls, in-process, once with every
+handler sharing one pool and once with the separate heavy and light pools used by
+RealEstateAppUI. A tiny randomly initialized GPT-2 stands in for the real model.
+
+Usage: python -m benchmarks.bench_handler_pools [--heavy-clients N] [--light-clients N] [--duration S]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.real_state_app import RealEstateApp
+from benchmarks.tiny_llm import build_tiny_llm
+from database.init_db import DatabaseHandler
+from front_end.handler_pool import HandlerPool
+from models.llm_handler import LLMHandler
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from models.response_cache import ResponseCache
+
+FEATURES = (8450, 7, 5, "Y", 2, 3, 2)
+
+
+async def load_test(app, heavy_pool, light_pool, heavy_clients, light_clients, duration):
+    generate_listing = heavy_pool.wrap(app.generate_listing)
+    predict_price = light_pool.wrap(app.predict_price)
+    query_closest_match = light_pool.wrap(app.query_closest_match)
+    deadline = time.perf_counter() + duration
+    latencies = {"predict_price": [], "query_closest_match": [], "generate_listing": []}
+    rejected = {name: 0 for name in latencies}
+
+    async def heavy_client(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async for _ in generate_listing(*FEATURES, f"client {i} listing {n}"):
+                    pass
+                latencies["generate_listing"].append(time.perf_counter() - start)
+            except Exception:
+                rejected["generate_listing"] += 1
+                await asyncio.sleep(0.05)
+            n += 1
+
+    async def light_client(i):
+        handlers = (("predict_price", predict_price), ("query_closest_match", query_closest_match))
+        n = 0
+        while time.perf_counter() < deadline:
+            name, handler = handlers[(i + n) % 2]
+            start = time.perf_counter()
+            try:
+                await handler(*FEATURES)
+                latencies[name].append(time.perf_counter() - start)
+            except Exception:
+                rejected[name] += 1
+            n += 1
+            # Think time between clicks
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(
+        *(heavy_client(i) for i in range(heavy_clients)), *(light_client(i) for i in range(light_clients))
+    )
+    return latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--heavy-clients", type=int, default=16)
+    parser.add_argument("--light-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--heavy-workers", type=int, default=2)
+    parser.add_argument("--light-workers", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler = DatabaseHandler(os.path.join(tmp, "bench.db"))
+        db_handler.initialize_database(args.data)
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "model.pth"))
+        model, tokenizer = build_tiny_llm()
+        # A disabled cache so every listing is generated
+        llm_handler = LLMHandler(model=model, tokenizer=tokenizer, cache=ResponseCache(max_size=0))
+        llm_handler.generation_kwargs["max_new_tokens"] = args.max_new_tokens
+        app = RealEstateApp(db_handler, model_handler, llm_handler)
+
+        workers = args.heavy_workers + args.light_workers
+        queue = args.heavy_clients + args.light_clients
+        shared = HandlerPool("shared", workers, queue)
+        configurations = {
+            "shared pool": (shared, shared),
+            "split pools": (HandlerPool("llm", args.heavy_workers, args.heavy_clients),
+                            HandlerPool("light", args.light_workers, args.light_clients)),
+        }
+
+        print(f"{args.heavy_clients} listing clients, {args.light_clients} fast clients, {args.duration:.0f}s each")
+        print(f"{'configuration':>14} {'endpoint':>20} {'requests':>9} {'rejected':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for label, (heavy_pool, light_pool) in configurations.items():
+            latencies, rejected = asyncio.run(load_test(
+                app, heavy_pool, light_pool, args.heavy_clients, args.light_clients, args.duration
+            ))
+            for name, values in latencies.items():
+                p50, p99 = (np.percentile(values, 50) * 1000, np.percentile(values, 99) * 1000) if values else (0, 0)
+                print(f"{label:>14} {name:>20} {len(values):9d} {rejected[name]:9d} {p50:9.1f} {p99:9.1f}")
+            heavy_pool.shutdown()
+            light_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
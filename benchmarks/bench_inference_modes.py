@@ -0,0 +1,120 @@
+"""
+Compare SalePriceModel inference modes: eager PyTorch, TorchScript, dynamically
+quantized TorchScript and the pure-NumPy fallback. Each mode runs in its own process
+so load time and resident memory include only what that mode imports.
+
+Usage: python -m benchmarks.bench_inference_modes [--rows N]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ARTIFACTS = {"eager": "model.pth", "torchscript": "model.pt", "quantized": "model_int8.pt", "numpy": "model.npz"}
+
+
+def rss_mib():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load(mode, path):
+    if mode == "numpy":
+        from models.numpy_model import NumpySalePriceModel
+        model = NumpySalePriceModel.load(path)
+        return lambda X: model(X)[:, 0]
+
+    import torch
+    if mode == "eager":
+        from models.model import SalePriceModel
+        model = SalePriceModel()
+        model.load_state_dict(torch.load(path)["model_state_dict"])
+        model.eval()
+    else:
+        model = torch.jit.load(path)
+
+    def predict(X):
+        with torch.inference_mode():
+            return model(torch.from_numpy(X))[:, 0].numpy()
+    return predict
+
+
+def child(mode, path, rows):
+    rss_before = rss_mib()
+    start = time.perf_counter()
+    predict = load(mode, path)
+    load_time = time.perf_counter() - start
+    rss_loaded = rss_mib()
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(1000, 50000, rows)] + [rng.integers(0, 10, rows) for _ in range(6)]).astype(np.float32)
+
+    single = X[:1]
+    for _ in range(100):
+        predict(single)
+    timings = []
+    for _ in range(2000):
+        start = time.perf_counter()
+        predict(single)
+        timings.append(time.perf_counter() - start)
+
+    predict(X[:1000])
+    start = time.perf_counter()
+    predict(X)
+    batch_time = time.perf_counter() - start
+
+    print(json.dumps({
+        "mode": mode,
+        "load_ms": load_time * 1000,
+        "rss_mib": rss_loaded,
+        "load_rss_mib": rss_loaded - rss_before,
+        "single_row_us": float(np.median(timings)) * 1e6,
+        "batch_rows_per_sec": rows / batch_time,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child, args.rows)
+        return
+
+    from models.model import SalePriceModel
+    from models.model_handler import ModelHandler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, ARTIFACTS["eager"]))
+        handler.save_model()
+        for mode in ("torchscript", "quantized", "numpy"):
+            handler.export_inference_model(os.path.join(tmp, ARTIFACTS[mode]), mode=mode)
+
+        print(f"{'mode':>12} {'load ms':>9} {'RSS MiB':>9} {'1 row us':>9} {'batch rows/s':>14} {'size KiB':>9}")
+        for mode, artifact in ARTIFACTS.items():
+            path = os.path.join(tmp, artifact)
+            output = subprocess.run(
+                [sys.executable, "-W", "ignore", "-m", "benchmarks.bench_inference_modes",
+                 "--rows", str(args.rows), "--child", mode, path],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>12} {result['load_ms']:9.1f} {result['rss_mib']:9.1f} {result['single_row_us']:9.1f} "
+                  f"{result['batch_rows_per_sec']:14,.0f} {os.path.getsize(path) / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Per-call overhead of the monitoring.metrics instrumentation: an empty function and
+RealEstateApp.predict_price, each called undecorated, decorated with metrics
+disabled (the default) and decorated with metrics enabled.
+
+Usage: python -m benchmarks.bench_instrumentation [--calls N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.real_state_app import RealEstateApp
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from models.prediction_cache import PredictionCache
+from monitoring import metrics
+
+FEATURES = (8450, 7, 5, "Y", 2, 3, 2)
+
+
+def per_call_ns(fn, args, calls, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            fn(*args)
+        best = min(best, (time.perf_counter_ns() - start) / calls)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20_000)
+    args = parser.parse_args()
+
+    def noop(*inputs):
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "model.pth"))
+        # No prediction cache, so every call runs the model
+        app = RealEstateApp(None, model_handler, None, PredictionCache(max_size=0))
+        targets = {
+            "empty function": (noop, metrics.timed("noop")(noop)),
+            "predict_price": (RealEstateApp.predict_price.__wrapped__, RealEstateApp.predict_price),
+        }
+
+        print(f"{'function':>15} {'undecorated ns':>15} {'disabled ns':>12} {'enabled ns':>11}")
+        for label, (plain, decorated) in targets.items():
+            call_args = FEATURES if label == "empty function" else (app, *FEATURES)
+            metrics.disable()
+            undecorated = per_call_ns(plain, call_args, args.calls)
+            disabled = per_call_ns(decorated, call_args, args.calls)
+            metrics.enable()
+            enabled = per_call_ns(decorated, call_args, args.calls)
+            metrics.disable()
+            print(f"{label:>15} {undecorated:15,.0f} {disabled:12,.0f} {enabled:11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare throughput and p50/p99 latency of micro-batched LLM generation against the
+one-request-at-a-time path, with concurrent clients and a tiny local model.
+
+Usage: python -m benchmarks.bench_llm_batching [--clients N] [--requests N]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.tiny_llm import build_tiny_llm
+from models.llm_handler import LLMHandler
+from models.response_cache import ResponseCache
+
+
+def run(handler, clients, requests):
+    def request(i):
+        start = time.perf_counter()
+        handler.generate_listing_llm(("property", i), f"request {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = np.array(list(pool.map(request, range(requests))))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait", type=float, default=0.02)
+    args = parser.parse_args()
+
+    model, tokenizer = build_tiny_llm()
+    for label, batch_size in (("one at a time", 1), ("micro-batched", args.max_batch_size)):
+        # A disabled cache so every request is generated
+        handler = LLMHandler(
+            model=model, tokenizer=tokenizer, cache=ResponseCache(max_size=0),
+            max_batch_size=batch_size, batch_wait=args.batch_wait,
+        )
+        handler.generation_kwargs["max_new_tokens"] = args.max_new_tokens
+        throughput, p50, p99 = run(handler, args.clients, args.requests)
+        print(f"{label:>14}: {throughput:6.1f} req/s  p50 {p50 * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms")
+        if handler.scheduler is not None:
+            handler.scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
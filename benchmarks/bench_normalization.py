@@ -0,0 +1,71 @@
+"""
+Time-to-target-loss of SalePriceModel trained on raw features and prices versus
+features and prices standardized with FeatureScaler.
+
+Usage: python -m benchmarks.bench_normalization [--target-rmse DOLLARS] [--max-epochs N]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+from datasets.dataset import FeatureScaler, HousingDataset
+from models.model import SalePriceModel
+
+
+def time_to_target(data, scaled, target_rmse, max_epochs, batch_size, lr):
+    torch.manual_seed(0)
+    dataset = HousingDataset(data.copy())
+    X_raw, y_raw = dataset.X.numpy().copy(), dataset.y.numpy().copy()
+    scaler = None
+    if scaled:
+        scaler = FeatureScaler().fit(X_raw, y_raw)
+        dataset.scale(scaler)
+    X_eval = torch.from_numpy(scaler.transform_features(X_raw) if scaler else X_raw)
+
+    model = SalePriceModel()
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    elapsed = 0.0
+    rmse = float("inf")
+    for epoch in range(1, max_epochs + 1):
+        start = time.perf_counter()
+        for batch_X, batch_y in dataset.batches(batch_size, shuffle=True):
+            optimizer.zero_grad()
+            loss = criterion(model(batch_X).squeeze(1), batch_y)
+            loss.backward()
+            optimizer.step()
+        elapsed += time.perf_counter() - start
+
+        with torch.inference_mode():
+            predictions = model(X_eval)[:, 0].numpy()
+        if scaler:
+            predictions = scaler.inverse_target(predictions)
+        rmse = float(np.sqrt(np.mean((predictions - y_raw) ** 2)))
+        if rmse <= target_rmse:
+            return epoch, elapsed, rmse
+    return None, elapsed, rmse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--target-rmse", type=float, default=40_000)
+    parser.add_argument("--max-epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)
+    for label, scaled in (("raw", False), ("standardized", True)):
+        epochs, elapsed, rmse = time_to_target(data, scaled, args.target_rmse, args.max_epochs, args.batch_size, args.lr)
+        reached = f"reached in {epochs} epochs" if epochs else f"not reached in {args.max_epochs} epochs"
+        print(f"{label:>12}: RMSE <= ${args.target_rmse:,.0f} {reached}, {elapsed:.2f}s (final RMSE ${rmse:,.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Latency of RealEstateApp.predict_price and query_closest_match with and without the
+PredictionCache, for a workload where agents re-query a skewed (Zipf) set of
+properties. Also checks that recording a sale or swapping the model invalidates
+cached results.
+
+Usage: python -m benchmarks.bench_prediction_cache [--requests N] [--properties N]
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from app.real_state_app import RealEstateApp
+from database.init_db import DatabaseHandler
+from datasets.dataset import FEATURE_COLUMNS
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from models.prediction_cache import PredictionCache
+
+
+def workload(db_handler, requests, properties, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = db_handler.conn.execute(
+        f"SELECT {', '.join(FEATURE_COLUMNS)} FROM properties ORDER BY rowid LIMIT ?", (properties,)
+    ).fetchall()
+    picks = np.minimum(rng.zipf(1.3, requests), len(rows)) - 1
+    return [rows[i] for i in picks]
+
+
+def run(app, queries):
+    timings = {"predict_price": [], "query_closest_match": []}
+    for features in queries:
+        for name in timings:
+            start = time.perf_counter()
+            getattr(app, name)(*features)
+            timings[name].append(time.perf_counter() - start)
+    return {name: float(np.mean(values)) * 1e6 for name, values in timings.items()}
+
+
+def check_invalidation(app):
+    features = (8450, 7, 5, "Y", 2, 3, 2)
+    app.query_closest_match(*features)
+    old_price = app.predict_price(*features)
+    before = app.prediction_cache.stats()["invalidations"]
+
+    app.record_price(123456, *features)
+    app.query_closest_match(*features)
+    assert app.prediction_cache.stats()["invalidations"] == before + 1, "closest match was served from a stale entry"
+
+    model = copy.deepcopy(app.model_handler.model)
+    with torch.no_grad():
+        model.fc[-1].bias += 1.0
+    app.model_handler.swap_model(model)
+    assert app.predict_price(*features) != old_price, "prediction was served from a stale entry"
+    return app.prediction_cache.stats()["invalidations"] - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--properties", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler = DatabaseHandler(os.path.join(tmp, "bench.db"))
+        data = db_handler.initialize_database(args.data)
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "model.pth"))
+        RealEstateApp(db_handler, model_handler, None).train_model(data, epochs=1)
+        queries = workload(db_handler, args.requests, args.properties)
+
+        uncached = run(RealEstateApp(db_handler, model_handler, None, PredictionCache(max_size=0)), queries)
+        app = RealEstateApp(db_handler, model_handler, None, PredictionCache(max_size=1024))
+        cached = run(app, queries)
+        stats = app.prediction_cache.stats()
+
+        print(f"{args.requests} requests over {args.properties} properties (Zipf)")
+        print(f"{'endpoint':>20} {'uncached us':>12} {'cached us':>10} {'speedup':>8}")
+        for name in uncached:
+            print(f"{name:>20} {uncached[name]:12.1f} {cached[name]:10.1f} {uncached[name] / cached[name]:7.1f}x")
+        print(f"hit rate {stats['hit_rate']:.1%}, saved {stats['saved_seconds']:.2f}s, {stats['size']} entries")
+        print(f"invalidation check passed ({check_invalidation(app)} stale entries dropped)")
+        db_handler.close()
+
+
+if __name__ == "__main__":
+    main()
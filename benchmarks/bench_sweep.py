@@ -0,0 +1,46 @@
+"""
+Wall time of the same hyperparameter sweep on 1 worker process versus N, each worker
+capped to one torch thread, to check that run_sweep scales with the number of cores.
+
+Usage: python -m benchmarks.bench_sweep [--processes 1 2 4] [--epochs N]
+"""
+import argparse
+import multiprocessing
+import time
+
+import pandas as pd
+
+from training.model_training import run_sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--processes", type=int, nargs="+", default=None)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data, nrows=args.rows)
+    grid = {
+        "lr": [0.001, 0.003],
+        "batch_size": [64, 256],
+        "epochs": [args.epochs],
+        "hidden_sizes": [(64, 32), (128, 64)],
+    }
+    cores = multiprocessing.cpu_count()
+    processes = args.processes or sorted({1, max(1, cores // 2), cores})
+
+    print(f"{len(data)} rows, 8 trials, {cores} cores")
+    print(f"{'processes':>10} {'wall s':>8} {'speedup':>8} {'best val RMSE':>14}")
+    baseline = None
+    for n in processes:
+        start = time.perf_counter()
+        results = run_sweep(data, grid=grid, patience=None, processes=n)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{n:>10} {elapsed:8.2f} {baseline / elapsed:7.2f}x {results[0]['val_rmse']:14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
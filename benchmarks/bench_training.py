@@ -0,0 +1,56 @@
+"""
+Compare training throughput of HousingDataset.batches against a per-sample DataLoader.
+
+Usage: python -m benchmarks.bench_training [--epochs N]
+"""
+import argparse
+import time
+
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+
+from datasets.dataset import HousingDataset
+from models.model import SalePriceModel
+
+
+def train(batches_per_epoch, epochs, lr):
+    torch.manual_seed(0)
+    model = SalePriceModel()
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    rows = 0
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        for batch_X, batch_y in batches_per_epoch():
+            optimizer.zero_grad()
+            loss = criterion(model(batch_X).squeeze(1), batch_y)
+            loss.backward()
+            optimizer.step()
+            rows += len(batch_X)
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    args = parser.parse_args()
+
+    dataset = HousingDataset(pd.read_csv(args.data))
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True)
+
+    loader_rate = train(lambda: loader, args.epochs, args.lr)
+    batches_rate = train(lambda: dataset.batches(args.batch_size, shuffle=True), args.epochs, args.lr)
+
+    print(f"DataLoader:               {loader_rate:,.0f} rows/sec")
+    print(f"HousingDataset.batches:   {batches_rate:,.0f} rows/sec")
+    print(f"speedup:                  {batches_rate / loader_rate:,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
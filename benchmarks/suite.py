@@ -0,0 +1,326 @@
+"""
+Offline benchmark suite covering the whole request path, written as JSON so results
+can be compared across commits.
+
+Sections:
+  db_init    DatabaseHandler.initialize_database on the Ames CSV and on synthetic
+             scale-ups, with get_closest_match and get_full_data_for_features
+             latency at each table size
+  training   HousingDataset construction and RealEstateApp.train_model throughput
+  predict    single-row predict_price latency and predict_prices batch throughput
+  profiles   rule-based generate_customer_profiles latency and bulk throughput
+  llm        LLMHandler generation with a tiny randomly initialized GPT-2
+
+Usage:
+  python -m benchmarks.suite [--sections db_init predict ...] [--sizes 100000 1000000 10000000]
+                             [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from app.real_state_app import RealEstateApp
+from database.feature_store import FeatureStore
+from database.init_db import DatabaseHandler
+from datasets.dataset import FEATURE_COLUMNS, HousingDataset, normalize_columns
+from models.model import SalePriceModel
+from models.model_handler import ModelHandler
+from models.prediction_cache import PredictionCache
+
+SECTIONS = ("db_init", "training", "predict", "profiles", "llm")
+
+# Metrics are compared by name: these suffixes are better when higher, the rest when lower
+HIGHER_IS_BETTER = ("_per_sec",)
+
+
+def percentiles(timings):
+    timings = np.asarray(timings) * 1000
+    return {"p50_ms": float(np.percentile(timings, 50)), "p99_ms": float(np.percentile(timings, 99))}
+
+
+def time_calls(fn, calls, warmup=10):
+    for args in calls[:warmup]:
+        fn(*args)
+    timings = []
+    for args in calls:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def synthetic_csv(source, path, rows, seed=0):
+    """
+    Write `rows` properties resampled from the source data, with lot areas and sale
+    years jittered so that the scaled-up table is not just repeated rows. Only the
+    model columns and the sale year are kept, which keeps 10M-row files manageable.
+    """
+    rng = np.random.default_rng(seed)
+    data = normalize_columns(pd.read_csv(source))[FEATURE_COLUMNS + ["yrsold", "saleprice"]]
+    for start in range(0, rows, 1_000_000):
+        n = min(1_000_000, rows - start)
+        chunk = data.iloc[rng.integers(0, len(data), n)].reset_index(drop=True)
+        chunk["lotarea"] = np.maximum(1000, chunk["lotarea"] + rng.integers(-500, 501, n))
+        chunk["yrsold"] = chunk["yrsold"] + rng.integers(-3, 4, n)
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def sample_queries(data, n, seed=0):
+    """
+    :param data: A normalized DataFrame or a FeatureStore.
+    """
+    rng = np.random.default_rng(seed)
+    if isinstance(data, FeatureStore):
+        rows = pd.DataFrame(data.X[np.sort(rng.integers(0, len(data), n))], columns=FEATURE_COLUMNS)
+    else:
+        rows = data[FEATURE_COLUMNS].iloc[rng.integers(0, len(data), n)]
+    rows = rows.assign(centralair=np.where(rows["centralair"] == 1, "Y", "N"))
+    return [tuple(row) for row in rows.itertuples(index=False)]
+
+
+def bench_table(db_handler, data_path, queries):
+    start = time.perf_counter()
+    data = db_handler.initialize_database(data_path)
+    init_seconds = time.perf_counter() - start
+    result = {
+        "rows": len(data),
+        "init_s": init_seconds,
+        "init_rows_per_sec": len(data) / init_seconds,
+        # Recent writes may still sit in the write-ahead log
+        "db_mib": sum(
+            os.path.getsize(path) for path in (db_handler.db_name, db_handler.db_name + "-wal") if os.path.exists(path)
+        ) / 2 ** 20,
+    }
+    closest = time_calls(db_handler.get_closest_match, [(features,) for features in sample_queries(data, queries)])
+    full_data = time_calls(db_handler.get_full_data_for_features, [(features,) for features in sample_queries(data, queries, seed=1)])
+    result.update({f"get_closest_match_{key}": value for key, value in percentiles(closest).items()})
+    result.update({f"get_full_data_for_features_{key}": value for key, value in percentiles(full_data).items()})
+    return result
+
+
+def bench_db_init(args, tmp):
+    results = {}
+    db_handler = DatabaseHandler(os.path.join(tmp, "ames.db"))
+    results["ames"] = bench_table(db_handler, args.data, args.queries)
+    db_handler.close()
+    for size in args.sizes:
+        csv_path = os.path.join(tmp, f"synthetic_{size}.csv")
+        synthetic_csv(args.data, csv_path, size, seed=args.seed)
+        db_handler = DatabaseHandler(os.path.join(tmp, f"synthetic_{size}.db"))
+        results[f"synthetic_{size}"] = bench_table(db_handler, csv_path, args.queries)
+        db_handler.close()
+        os.remove(csv_path)
+        os.remove(db_handler.db_name)
+    return results
+
+
+def bench_training(args, tmp):
+    data = pd.read_csv(args.data)
+    dataset_seconds = train_seconds = float("inf")
+    epochs = 3
+    # Best of several runs, which is far less sensitive to a busy machine than the mean
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        dataset = HousingDataset(data.copy())
+        dataset_seconds = min(dataset_seconds, time.perf_counter() - start)
+
+        torch.manual_seed(args.seed)
+        model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "train.pth"))
+        app = RealEstateApp(None, model_handler, None)
+        start = time.perf_counter()
+        app.train_model(data, epochs=epochs, batch_size=32)
+        train_seconds = min(train_seconds, time.perf_counter() - start)
+    return {
+        "rows": len(dataset),
+        "housing_dataset_s": dataset_seconds,
+        "housing_dataset_rows_per_sec": len(dataset) / dataset_seconds,
+        "train_model_s": train_seconds,
+        "train_model_rows_per_sec": len(dataset) * epochs / train_seconds,
+    }
+
+
+def bench_predict(args, tmp):
+    torch.manual_seed(args.seed)
+    model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "predict.pth"))
+    # No prediction cache, so every call runs the model
+    app = RealEstateApp(None, model_handler, None, PredictionCache(max_size=0))
+    data = normalize_columns(pd.read_csv(args.data))
+    single = time_calls(app.predict_price, sample_queries(data, args.queries * 10, seed=args.seed))
+
+    rng = np.random.default_rng(args.seed)
+    batch = data[FEATURE_COLUMNS].iloc[rng.integers(0, len(data), args.batch_rows)].reset_index(drop=True)
+    app.predict_prices(batch.head(1000))
+    batch_seconds = float("inf")
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        app.predict_prices(batch)
+        batch_seconds = min(batch_seconds, time.perf_counter() - start)
+    return {
+        **{f"predict_price_{key}": value for key, value in percentiles(single).items()},
+        "predict_prices_rows": args.batch_rows,
+        "predict_prices_s": batch_seconds,
+        "predict_prices_rows_per_sec": args.batch_rows / batch_seconds,
+    }
+
+
+def bench_profiles(args, tmp):
+    torch.manual_seed(args.seed)
+    model_handler = ModelHandler(SalePriceModel(), model_path=os.path.join(tmp, "profiles.pth"))
+    app = RealEstateApp(None, model_handler, None, PredictionCache(max_size=0))
+    data = normalize_columns(pd.read_csv(args.data))
+    single = time_calls(app.generate_customer_profiles, sample_queries(data, args.queries, seed=args.seed))
+
+    rng = np.random.default_rng(args.seed)
+    batch = data[FEATURE_COLUMNS].iloc[rng.integers(0, len(data), args.batch_rows)].reset_index(drop=True)
+    bulk_seconds = float("inf")
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        profiles = app.generate_customer_profiles_bulk(batch)
+        bulk_seconds = min(bulk_seconds, time.perf_counter() - start)
+    return {
+        **{f"generate_customer_profiles_{key}": value for key, value in percentiles(single).items()},
+        "bulk_rows": args.batch_rows,
+        "bulk_profiles_per_sec": len(profiles) / bulk_seconds,
+    }
+
+
+def bench_llm(args, tmp):
+    from benchmarks.tiny_llm import build_tiny_llm
+    from models.llm_handler import LLMHandler
+    from models.response_cache import ResponseCache
+
+    model, tokenizer = build_tiny_llm(seed=args.seed)
+    # A disabled cache so every request is generated; greedy decoding for repeatable output
+    handler = LLMHandler(model=model, tokenizer=tokenizer, cache=ResponseCache(max_size=0))
+    handler.generation_kwargs.update({"max_new_tokens": args.max_new_tokens, "do_sample": False})
+    handler.generation_kwargs.pop("temperature", None)
+    features = (8450, 7, 5, "Y", 2, 3, 2)
+    requests = [(features, f"request {i}") for i in range(args.llm_requests)]
+    handler.generate_listing_llm(*requests[0])
+
+    latencies = time_calls(handler.generate_listing_llm, requests, warmup=0)
+    first_token = []
+    for request in requests:
+        start = time.perf_counter()
+        stream = handler.stream_listing_llm(*request)
+        next(stream)
+        first_token.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+    return {
+        "max_new_tokens": args.max_new_tokens,
+        **{f"generate_listing_llm_{key}": value for key, value in percentiles(latencies).items()},
+        "generate_listing_llm_tokens_per_sec": args.max_new_tokens * len(latencies) / sum(latencies),
+        **{f"stream_first_token_{key}": value for key, value in percentiles(first_token).items()},
+    }
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "seed": args.seed,
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+    }
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current, baseline_path, threshold):
+    """
+    Print every metric that changed by more than `threshold` relative to a baseline file.
+    :return: The number of regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)["results"])
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (changes over {threshold:.0%}):")
+    for name, value in flatten(current).items():
+        old = baseline.get(name)
+        if not old or name.endswith((".rows", "_rows", ".max_new_tokens")):
+            continue
+        change = value / old - 1
+        if abs(change) < threshold:
+            continue
+        better = change > 0 if name.endswith(HIGHER_IS_BETTER) else change < 0
+        regressions += not better
+        print(f"  {'improved ' if better else 'REGRESSED'} {name}: {old:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100_000, 1_000_000],
+                        help="Synthetic table sizes; add 10000000 for the full scale-up")
+    parser.add_argument("--queries", type=int, default=200, help="Lookups timed per table size")
+    parser.add_argument("--batch-rows", type=int, default=100_000)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--llm-requests", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3, help="Runs of each throughput measurement, best kept")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads, fixed for comparable runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file to write, default benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", default=None, help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported by --compare")
+    args = parser.parse_args()
+
+    # Everything runs from local files
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    torch.set_num_threads(args.threads)
+    sections = {
+        "db_init": bench_db_init, "training": bench_training, "predict": bench_predict,
+        "profiles": bench_profiles, "llm": bench_llm,
+    }
+
+    report = {"meta": metadata(args), "results": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.sections:
+            start = time.perf_counter()
+            report["results"][name] = sections[name](args, tmp)
+            print(f"{name}: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    output = args.output or os.path.join("benchmarks", "results", f"{report['meta']['commit'] or 'local'}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        if compare(report["results"], args.compare, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+A tiny, randomly initialized GPT-2 and byte-level BPE tokenizer built locally, so the
+LLM benchmarks run offline without downloading weights.
+"""
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+CORPUS = [
+    "Generate a real estate listing with these features",
+    "Description: a cozy family home with a large lot, central air and a two car garage.",
+]
+
+
+def build_tiny_llm(n_embd=64, n_layer=2, n_head=2, vocab_size=512, seed=0):
+    """
+    :return: A (model, tokenizer) pair that can be passed to LLMHandler.
+    """
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(CORPUS, trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<|endoftext|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    ))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<|endoftext|>",
+        eos_token="<|endoftext|>",
+        clean_up_tokenization_spaces=False,
+    )
+
+    torch.manual_seed(seed)
+    config = GPT2Config(
+        vocab_size=len(tokenizer),
+        n_positions=2048,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=n_head,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+    )
+    model = GPT2LMHeadModel(config)
+    model.eval()
+    return model, tokenizer
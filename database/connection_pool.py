@@ -0,0 +1,163 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+def connect(db_name, read_only=False):
+    """
+    Open a connection with the pragmas shared by every connection to the database.
+    Connections run in autocommit mode; write transactions are opened explicitly.
+    """
+    conn = sqlite3.connect(db_name, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    if read_only:
+        conn.execute("PRAGMA cache_size = -16384")  # 16 MiB per reader, the OS page cache is shared
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA cache_size = -65536")  # 64 MiB
+        # Commits are batched, so each one can afford a full sync
+        conn.execute("PRAGMA synchronous = FULL")
+    return conn
+
+
+class ConnectionPool:
+    """
+    One read-only connection per thread. In WAL mode readers never block each other or
+    the writer, so concurrent requests do not contend for a shared connection.
+    """
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread -> connection
+
+    def reader(self):
+        """
+        Return the calling thread's read connection, opening it on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_name, read_only=True)
+            with self._lock:
+                # Connections of threads that have exited are closed here
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class BatchWriter:
+    """
+    Serialized writer that groups queued statements into periodic transactions.
+
+    Statements submitted from any thread are collected for up to `flush_interval`
+    seconds (or until `max_batch_size` are queued) and committed together on a single
+    writer thread, so concurrent users never see "database is locked" and pay for one
+    sync per batch rather than one per row. A write is durable once its Future resolves;
+    flush() waits for everything submitted before it.
+    """
+
+    def __init__(self, db_name, flush_interval=0.0, max_batch_size=1024):
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.conn = connect(db_name)
+        self._lock = threading.Lock()  # Held while a batch or an exclusive caller uses the connection
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, query, params=()):
+        """
+        Queue a statement for the next batch.
+        :return: A Future resolving to the statement's lastrowid once it is committed.
+        """
+        future = Future()
+        self._queue.put((query, params, future))
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Commit everything submitted so far and wait until it is durable.
+        """
+        future = Future()
+        self._queue.put((None, None, future))
+        future.result(timeout)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Exclusive use of the write connection, e.g. for bulk loads or schema changes.
+        Pending statements are committed first and batching pauses until the block exits.
+        """
+        self.flush()
+        with self._lock:
+            yield self.conn
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self.conn.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # Everything queued while the previous batch was committing joins this one, then
+            # the batch stays open until the flush interval ends. A flush request commits
+            # straight away.
+            while len(batch) < self.max_batch_size and batch[-1][0] is not None:
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Close once this batch is committed
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+        with self._lock:
+            try:
+                self.conn.execute("BEGIN")
+                for query, params, future in batch:
+                    if query is None:
+                        results.append((future, None))
+                        continue
+                    try:
+                        results.append((future, self.conn.execute(query, params).lastrowid))
+                    except sqlite3.Error as e:
+                        # A failing statement is rolled back on its own and fails only its caller
+                        results.append((future, e))
+                self.conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                return
+        for future, result in results:
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from datasets.dataset import FEATURE_COLUMNS, encode_features
+
+# Arrays of the store: name -> (dtype, columns per row)
+ARRAYS = {
+    "features": (np.float32, len(FEATURE_COLUMNS)),
+    "targets": (np.float32, 1),
+    "row_ids": (np.int64, 1),
+    "years": (np.float64, 1),
+}
+
+
+class FeatureStore:
+    """
+    Columnar, memory-mapped copy of the model columns of the properties table.
+
+    Each array (encoded features, sale prices, row ids and sale years) lives in its own
+    raw file under `path`, and meta.json records how many rows are valid. Readers get
+    zero-copy views of the mapped files, so training, batch prediction and the
+    nearest-neighbour index share one copy of the data through the page cache, across
+    threads and processes, and the table may be larger than RAM. Missing sale years
+    are stored as -inf, which sorts like NULL in "ORDER BY yrsold DESC".
+
+    Only one process may write to a store; others open it with read_only=True.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.rows = 0
+        self.capacity = 0
+        self.max_rowid = 0
+        self.source_hash = None
+        self._arrays = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def X(self):
+        """
+        Encoded features, a float32 view of shape (rows, 7).
+        """
+        return self._view("features")
+
+    @property
+    def y(self):
+        """
+        Sale prices, a float32 view of shape (rows,).
+        """
+        return self._view("targets")
+
+    @property
+    def row_ids(self):
+        return self._view("row_ids")
+
+    @property
+    def years(self):
+        return self._view("years")
+
+    def _view(self, name):
+        dtype, width = ARRAYS[name]
+        if not self._arrays:
+            return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+        array = self._arrays[name][:self.rows]
+        return array if width > 1 else array.reshape(self.rows)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def refresh(self):
+        """
+        Re-read meta.json, picking up rows appended by the writing process.
+        """
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {"rows": 0, "capacity": 0, "max_rowid": 0, "source_hash": None}
+        self.rows, self.max_rowid, self.source_hash = meta["rows"], meta["max_rowid"], meta["source_hash"]
+        if meta["capacity"] != self.capacity:
+            self._map(meta["capacity"])
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        self._arrays = {}
+        if capacity == 0:
+            return
+        mode = "r" if self.read_only else "r+"
+        for name, (dtype, width) in ARRAYS.items():
+            self._arrays[name] = np.memmap(self._file(name), dtype=dtype, mode=mode, shape=(capacity, width))
+
+    def _reserve(self, rows):
+        if rows <= self.capacity:
+            return
+        # Files only ever grow, so views handed out earlier stay valid
+        capacity = max(rows, 2 * self.capacity, 1024)
+        os.makedirs(self.path, exist_ok=True)
+        for name, (dtype, width) in ARRAYS.items():
+            with open(self._file(name), "ab") as f:
+                f.truncate(capacity * width * np.dtype(dtype).itemsize)
+        self._map(capacity)
+
+    def clear(self):
+        """
+        Drop every row (the files keep their capacity).
+        """
+        with self._lock:
+            self.rows = 0
+            self.max_rowid = 0
+            self.source_hash = None
+            self._write_meta()
+
+    def append(self, X, y, row_ids, years):
+        """
+        Append encoded rows. Call flush() to make them visible to other processes.
+        """
+        if self.read_only:
+            raise PermissionError(f"Feature store {self.path} was opened read-only.")
+        n = len(row_ids)
+        with self._lock:
+            self._reserve(self.rows + n)
+            start = self.rows
+            self._arrays["features"][start:start + n] = X
+            self._arrays["targets"][start:start + n, 0] = y
+            self._arrays["row_ids"][start:start + n, 0] = row_ids
+            self._arrays["years"][start:start + n, 0] = years
+            self.rows += n
+            if n:
+                self.max_rowid = max(self.max_rowid, int(np.max(row_ids)))
+
+    def append_frame(self, frame):
+        """
+        Append a DataFrame holding a rowid column, the feature columns, saleprice and yrsold.
+        """
+        years = pd.to_numeric(frame['yrsold'], errors='coerce').to_numpy(dtype=np.float64)
+        self.append(
+            encode_features(frame),
+            pd.to_numeric(frame['saleprice'], errors='coerce').fillna(0).to_numpy(dtype=np.float32),
+            frame['rowid'].to_numpy(dtype=np.int64),
+            np.where(np.isnan(years), -np.inf, years),
+        )
+
+    def flush(self, source_hash=None):
+        """
+        Write the appended rows to disk, then publish the new row count in meta.json.
+        """
+        with self._lock:
+            if source_hash is not None:
+                self.source_hash = source_hash
+            for array in self._arrays.values():
+                array.flush()
+            self._write_meta()
+
+    def _write_meta(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({
+                "rows": self.rows, "capacity": self.capacity, "max_rowid": self.max_rowid,
+                "source_hash": self.source_hash,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def sync(self, conn, chunksize=100_000):
+        """
+        Bring the store up to date with the properties table: rows added since the last
+        sync are appended, and the store is rebuilt when the table itself was rebuilt.
+        :return: The number of rows appended.
+        """
+        with self._sync_lock:
+            return self._sync(conn, chunksize)
+
+    def _sync(self, conn, chunksize):
+        try:
+            row = conn.execute("SELECT value FROM metadata WHERE key = 'source_hash'").fetchone()
+        except sqlite3.OperationalError:
+            row = None  # No metadata table yet
+        source_hash = row[0] if row else None
+        max_rowid = conn.execute("SELECT MAX(rowid) FROM properties").fetchone()[0] or 0
+        if source_hash != self.source_hash or max_rowid < self.max_rowid:
+            self.clear()
+        if max_rowid == self.max_rowid:
+            return 0
+
+        appended = 0
+        query = f"""
+        SELECT rowid, {', '.join(FEATURE_COLUMNS)}, saleprice, yrsold FROM properties
+        WHERE rowid > ? ORDER BY rowid
+        """
+        for frame in pd.read_sql_query(query, conn, params=(self.max_rowid,), chunksize=chunksize):
+            self.append_frame(frame)
+            appended += len(frame)
+        self.flush(source_hash)
+        return appended
@@ -1,56 +1,233 @@
+import hashlib
 import sqlite3
+import time
+import numpy as np
 import pandas as pd
+from database.connection_pool import BatchWriter, ConnectionPool
+from database.feature_store import FeatureStore
+from database.spatial_index import FeatureIndex
+from monitoring import metrics
+from datasets.dataset import FEATURE_COLUMNS, encode_feature_row, normalize_column_name, normalize_columns
+
+# Columns that must be present and numeric in every dataset
+MODEL_COLUMNS = FEATURE_COLUMNS + ['saleprice']
+
+# Per-feature difference columns reported alongside a closest match
+DIFF_COLUMNS = [
+    'lot_area_diff', 'overall_quality_diff', 'overall_condition_diff', 'central_air_diff',
+    'full_bath_diff', 'bedrooms_diff', 'garage_cars_diff'
+]
+
+# The most recent sale matching any feature: one index seek per feature, merged with
+# UNION ALL. Equivalent to "WHERE lotarea = ? OR ... ORDER BY yrsold DESC LIMIT 1",
+# which SQLite can only answer by scanning and sorting the whole table.
+FULL_DATA_QUERY = """
+SELECT * FROM properties WHERE rowid = (
+    SELECT id FROM ({})
+    ORDER BY yrsold DESC, id LIMIT 1
+)
+""".format("\n    UNION ALL ".join(
+    f'SELECT * FROM (SELECT rowid AS id, yrsold FROM properties WHERE "{col}" = ? ORDER BY yrsold DESC, rowid LIMIT 1)'
+    for col in FEATURE_COLUMNS
+))
 
 class DatabaseHandler:
-    def __init__(self, db_name="real_estate.db"):
+    def __init__(self, db_name="real_estate.db", flush_interval=0.0, feature_store_path=None):
+        """
+        :param flush_interval: Seconds the writer keeps a batch of inserts open before
+                               committing it as one transaction. With 0, each batch holds
+                               whatever was queued while the previous one was committing.
+        :param feature_store_path: Directory of the memory-mapped FeatureStore, by default
+                                   the database name followed by ".features".
+        """
         self.db_name = db_name
-        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        # All writes go through one serialized writer, reads use a connection per thread
+        self.writer = BatchWriter(self.db_name, flush_interval=flush_interval)
+        self.pool = ConnectionPool(self.db_name)
+        # Columnar copy of the model columns that training, batch prediction and the
+        # nearest-neighbour index read from
+        self.feature_store = FeatureStore(feature_store_path or f"{db_name}.features")
+        self.feature_index = None
+        # Bumped whenever the properties table changes, so cached lookups can be invalidated
+        self.version = 0
+        # Databases built before the (feature, yrsold) indexes get them once here
+        with self.writer.connection() as conn:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'properties'").fetchone():
+                self._create_indexes(conn)
+
+    @property
+    def conn(self):
+        """
+        The calling thread's read-only connection.
+        """
+        return self.pool.reader()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every write submitted so far is committed.
+        """
+        self.writer.flush(timeout)
+
+    def close(self):
+        self.writer.close()
+        self.pool.close()
+
+    @metrics.timed("initialize_database")
+    def initialize_database(self, data_path, chunksize=100_000):
+        """
+        (Re)build the properties table from a CSV file.
+        The file is streamed in chunks and inserted with executemany inside a single
+        transaction, so memory stays bounded by the chunk size.
+        :return: The FeatureStore holding the model columns of every row, ready to be
+                 passed to RealEstateApp.train_model.
+        """
+        raw_columns = list(pd.read_csv(data_path, nrows=0).columns)
+        columns = [normalize_column_name(col) for col in raw_columns]
+        missing_columns = set(MODEL_COLUMNS + ['yrsold']) - set(columns)
+        if missing_columns:
+            raise KeyError(f"Dataset is missing one or more required columns: {missing_columns}")
 
-    def initialize_database(self, data_path):
-            data = pd.read_csv(data_path)
+        # Column types are inferred once from a sample, then fixed for every chunk
+        sample = normalize_columns(pd.read_csv(data_path, nrows=10_000))
+        column_types = {col: self._sqlite_type(sample[col]) for col in columns}
+        column_types.update({col: "NUMERIC" for col in MODEL_COLUMNS})
+        column_types['centralair'] = "INTEGER"
+        # Every column is parsed as text, since a sparse column can hold only numbers (or
+        # nothing) in the sample and text further down; the model columns are coerced
+        # below, and SQLite's column affinity stores the numeric text of the others as numbers
+        column_types['datasource'] = "INTEGER"
+        columns.append('datasource')
 
-            # Normalize column names
-            data.columns = [col.strip().replace(' ', '').replace('/', '').lower() for col in data.columns]
+        column_defs = ", ".join(f'"{col}" {column_types[col]}' for col in columns)
+        insert_query = f"INSERT INTO properties VALUES ({', '.join('?' * len(columns))})"
 
-            # Required columns
-            required_columns = [
-                'lotarea', 'overallqual', 'overallcond', 'centralair',
-                'fullbath', 'bedroomabvgr', 'garagecars', 'saleprice'
-            ]
+        # Row ids of a freshly created table run from 1 in insertion order
+        next_rowid = 1
+        # The bulk load has the write connection to itself; batched writes wait for it
+        with self.writer.connection() as conn:
+            conn.execute("PRAGMA synchronous = OFF")
+            try:
+                self.feature_store.clear()
+                conn.execute("BEGIN")
+                conn.execute("DROP TABLE IF EXISTS properties")
+                conn.execute(f"CREATE TABLE properties ({column_defs})")
 
-            missing_columns = set(required_columns) - set(data.columns)
-            if missing_columns:
-                raise KeyError(f"Dataset is missing one or more required columns: {missing_columns}")
+                for chunk in pd.read_csv(data_path, chunksize=chunksize, dtype=object):
+                    normalize_columns(chunk)
 
-            # Convert Central Air to numeric (Y -> 1, N -> 0)
-            data['centralair'] = data['centralair'].map({'Y': 1, 'N': 0}).fillna(0)
+                    # Convert Central Air to numeric (Y -> 1, N -> 0)
+                    chunk['centralair'] = chunk['centralair'].map({'Y': 1, 'N': 0}).fillna(0)
 
-            # Ensure all required columns are numeric
-            for col in required_columns:
-                data[col] = pd.to_numeric(data[col], errors='coerce').fillna(0)
+                    # Ensure all required columns are numeric
+                    for col in MODEL_COLUMNS:
+                        chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0)
+                    chunk['yrsold'] = pd.to_numeric(chunk['yrsold'], errors='coerce')
+                    chunk['datasource'] = 1
 
-            data['datasource'] = 1  # Add datasource column
-            data.to_sql("properties", self.conn, if_exists="replace", index=False)
-            print(f"Database initialized at {self.db_name}")
+                    conn.executemany(insert_query, zip(*(chunk[col].tolist() for col in columns)))
+                    self.feature_store.append_frame(
+                        chunk[MODEL_COLUMNS + ['yrsold']].assign(rowid=np.arange(next_rowid, next_rowid + len(chunk)))
+                    )
+                    next_rowid += len(chunk)
+
+                self._create_indexes(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self.feature_store.clear()
+                raise
+            finally:
+                conn.execute("PRAGMA synchronous = FULL")
 
             # Create additional tables if they don't exist
-            self.conn.execute("""
+            conn.execute("""
                    CREATE TABLE IF NOT EXISTS listings (
                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                       description TEXT NOT NULL
+                       description TEXT NOT NULL,
+                       prompt_key TEXT,
+                       created_at REAL
                    )
                """)
-            self.conn.execute("DROP TABLE IF EXISTS feedback")
-            self.conn.execute("""
+            # Databases created before listings were keyed by prompt lack these columns
+            listing_columns = {row[1] for row in conn.execute("PRAGMA table_info(listings)")}
+            for col, col_type in (("prompt_key", "TEXT"), ("created_at", "REAL")):
+                if col not in listing_columns:
+                    conn.execute(f"ALTER TABLE listings ADD COLUMN {col} {col_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_prompt_key ON listings (prompt_key)")
+            conn.execute("DROP TABLE IF EXISTS feedback")
+            conn.execute("""
                     CREATE TABLE IF NOT EXISTS feedback (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         listing TEXT,
                         feedback TEXT
                     );
                     """)
-            print(f"Database initialized at {self.db_name}")
+            source_hash = self.source_hash(data_path)
+            conn.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('source_hash', ?)", (source_hash,))
+
+        self.feature_store.flush(source_hash)
+        self.feature_index = FeatureIndex.from_store(self.feature_store)
+        self.version += 1
+        metrics.count("rows_scanned_total", len(self.feature_store), operation="initialize_database")
+        print(f"Database initialized at {self.db_name}")
+        return self.feature_store
+
+    @staticmethod
+    def _create_indexes(conn):
+        """
+        Index every feature together with the sale year, newest first, so that the most
+        recent sale for a feature value is a single index seek.
+        """
+        for col in FEATURE_COLUMNS:
+            conn.execute(f'DROP INDEX IF EXISTS idx_properties_{col}')
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_properties_{col}_yrsold ON properties ("{col}", yrsold DESC)'
+            )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_properties_yrsold ON properties (yrsold)')
+
+    @staticmethod
+    def source_hash(data_path):
+        """
+        SHA-256 of a source file's contents, read in 1 MiB blocks.
+        """
+        digest = hashlib.sha256()
+        with open(data_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def is_up_to_date(self, data_path):
+        """
+        Whether the properties table was built from a file with the same contents as data_path.
+        """
+        try:
+            row = self.conn.execute("SELECT value FROM metadata WHERE key = 'source_hash'").fetchone()
+        except sqlite3.OperationalError:
+            return False  # No metadata table yet
+        return row is not None and row[0] == self.source_hash(data_path)
+
+    @metrics.timed("load_training_data")
+    def load_training_data(self):
+        """
+        Read the model columns of the properties table, as returned by initialize_database.
+        """
+        data = pd.read_sql_query(f"SELECT {', '.join(MODEL_COLUMNS)}, yrsold FROM properties", self.conn)
+        metrics.count("rows_scanned_total", len(data), operation="load_training_data")
+        return data
 
+    @staticmethod
+    def _sqlite_type(values):
+        # A column that is empty in the sample may still hold text further down
+        if values.isna().all():
+            return "TEXT"
+        if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+            return "INTEGER"
+        if pd.api.types.is_float_dtype(values):
+            return "REAL"
+        return "TEXT"
 
+    @metrics.timed("add_verified_price")
     def add_verified_price(self, price, lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms,
                            garage_cars):
         """
@@ -60,69 +237,149 @@ class DatabaseHandler:
         INSERT INTO properties (SalePrice, LotArea, OverallQual, OverallCond, CentralAir, FullBath, BedroomAbvGr, GarageCars, datasource)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
-        with self.conn as conn:
-            conn.execute(query, (
-            price, lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms, garage_cars, 2))
-            conn.commit()
-            print("Verified sale price added successfully!")
+        features = encode_feature_row(
+            (lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms, garage_cars)
+        )
+        # Waits for the batch holding the sale to commit, so it is durable when this returns
+        row_id = self.writer.submit(query, (price, *features, 2)).result()
+        self.sync_feature_store()
+        if self.feature_index is not None:
+            self.feature_index.add(features, row_id)
+        self.version += 1
+        print("Verified sale price added successfully!")
 
-    def record_listing(self, listing):
-        self.conn.execute("INSERT INTO listings (description) VALUES (?)", (listing,))
-        self.conn.commit()
+    def get_verified_sales(self, after_rowid=0):
+        """
+        Return the verified sales (datasource = 2) recorded after a given row id.
+        :return: A DataFrame with a rowid column followed by the model columns.
+        """
+        query = f"""
+        SELECT rowid, {', '.join(MODEL_COLUMNS)} FROM properties
+        WHERE datasource = 2 AND rowid > ?
+        ORDER BY rowid
+        """
+        return pd.read_sql_query(query, self.conn, params=(after_rowid,))
+
+    def sample_properties(self, n, max_rowid=None, seed=None):
+        """
+        Return a random sample of up to n properties with row id <= max_rowid.
+        Row ids are drawn directly instead of sorting the whole table by RANDOM().
+        :return: A DataFrame with a rowid column followed by the model columns.
+        """
+        if max_rowid is None:
+            max_rowid = self.conn.execute("SELECT MAX(rowid) FROM properties").fetchone()[0] or 0
+        row_ids = np.random.default_rng(seed).integers(1, max_rowid + 1, size=min(n, max_rowid))
+        row_ids = np.unique(row_ids).tolist()
+        frames = []
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(row_ids), 10_000):
+            batch = row_ids[start:start + 10_000]
+            query = f"SELECT rowid, {', '.join(MODEL_COLUMNS)} FROM properties WHERE rowid IN ({', '.join('?' * len(batch))})"
+            frames.append(pd.read_sql_query(query, self.conn, params=batch))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['rowid'] + MODEL_COLUMNS)
+
+    def record_listing(self, listing, prompt_key=None):
+        """
+        Queue a listing for the next batched write.
+        :return: A Future that resolves once the listing is committed.
+        """
+        return self.writer.submit(
+            "INSERT INTO listings (description, prompt_key, created_at) VALUES (?, ?, ?)",
+            (listing, prompt_key, time.time()),
+        )
+
+    def get_cached_listing(self, prompt_key, max_age=None):
+        """
+        Return the most recent listing recorded under a prompt key, or None.
+        :param max_age: Ignore listings older than this many seconds.
+        """
+        min_created_at = time.time() - max_age if max_age is not None else 0
+        row = self.conn.execute(
+            "SELECT description FROM listings WHERE prompt_key = ? AND created_at >= ? ORDER BY id DESC LIMIT 1",
+            (prompt_key, min_created_at),
+        ).fetchone()
+        return row[0] if row else None
 
     def record_feedback(self, listing, feedback):
-        self.conn.execute("INSERT INTO feedback (listing, feedback) VALUES (?, ?)", (listing, feedback))
-        self.conn.commit()
+        """
+        Queue feedback for the next batched write.
+        :return: A Future that resolves once the feedback is committed.
+        """
+        return self.writer.submit("INSERT INTO feedback (listing, feedback) VALUES (?, ?)", (listing, feedback))
 
-    def get_full_data_for_features(self, features):
-        query = """
-        SELECT * FROM properties 
-        WHERE lotarea = ? OR overallqual = ? OR overallcond = ? OR centralair = ?
-        OR fullbath = ? OR bedroomabvgr = ? OR garagecars = ?
-        ORDER BY yrsold DESC LIMIT 1
+    @metrics.timed("get_full_data_for_features")
+    def get_full_data_for_features(self, features, as_dict=False):
+        """
+        Return the most recently sold property matching any one of the given feature values.
+        Each feature is looked up separately on its (feature, yrsold DESC) index, so the
+        cost does not grow with the size of the table. Ties on the sale year go to the
+        lowest row id.
+        :param features: A tuple of input values in the order:
+                         (lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms, garage_cars)
+        :param as_dict: Return the row as a dict keyed by column name instead of a tuple.
+        :return: The full properties row, or None if nothing matches.
+        """
+        cursor = self.conn.execute(FULL_DATA_QUERY, tuple(features))
+        row = cursor.fetchone()
+        if as_dict and row is not None:
+            return dict(zip((col[0] for col in cursor.description), row))
+        return row
+
+    def sync_feature_store(self):
+        """
+        Bring the feature store up to date with the properties table.
+        :return: The FeatureStore.
+        """
+        appended = self.feature_store.sync(self.conn)
+        metrics.count("rows_scanned_total", appended, operation="sync_feature_store")
+        return self.feature_store
+
+    def build_feature_index(self):
         """
-        cursor = self.conn.execute(query, features)
-        return cursor.fetchone()
+        Build a nearest-neighbour index over the feature store.
+        """
+        return FeatureIndex.from_store(self.sync_feature_store())
 
-    def get_closest_match(self, inputs):
+    def get_closest_match(self, inputs, scale=None):
         """
         Retrieve the closest match from the database for the given input features.
         :param inputs: A tuple of input values in the order:
                        (lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms, garage_cars)
+        :param scale: Optional per-feature weights applied to the absolute differences.
         :return: A dictionary containing the closest match property details or None if no match is found.
         """
-        query = """
-        SELECT *, 
-               ABS(LotArea - ?) AS lot_area_diff,
-               ABS(OverallQual - ?) AS overall_quality_diff,
-               ABS(OverallCond - ?) AS overall_condition_diff,
-               ABS(CentralAir - ?) AS central_air_diff,
-               ABS(FullBath - ?) AS full_bath_diff,
-               ABS(BedroomAbvGr - ?) AS bedrooms_diff,
-               ABS(GarageCars - ?) AS garage_cars_diff,
-               (ABS(LotArea - ?) +
-                ABS(OverallQual - ?) +
-                ABS(OverallCond - ?) +
-                ABS(CentralAir - ?) +
-                ABS(FullBath - ?) +
-                ABS(BedroomAbvGr - ?) +
-                ABS(GarageCars - ?)) AS total_diff
-        FROM properties
-        ORDER BY total_diff ASC, YrSold DESC
-        LIMIT 1
-        """
-
-        # The inputs are repeated for each difference calculation and total_diff
-        params = inputs * 2
-
-        cursor = self.conn.execute(query, params)
-        result = cursor.fetchone()
-
-        if result:
-            # Map the result to a dictionary
-            columns = [col[0] for col in cursor.description]
-            closest_match = dict(zip(columns, result))
-            return closest_match
-        else:
-            return None
+        matches = self.get_closest_matches(inputs, k=1, scale=scale)
+        return matches[0] if matches else None
+
+    @metrics.timed("get_closest_matches")
+    def get_closest_matches(self, inputs, k=5, scale=None):
+        """
+        Retrieve the k closest matches from the database for the given input features.
+        Matches are ranked by total_diff, the (optionally weighted) sum of absolute
+        feature differences, then by the most recent sale year.
+        :return: A list of dictionaries containing property details and their differences.
+        """
+        if self.feature_index is None:
+            self.feature_index = self.build_feature_index()
+
+        features = encode_feature_row(inputs)
+        distances, row_ids = self.feature_index.query(features, k=k, scale=scale)
+        if not len(row_ids):
+            return []
+
+        placeholders = ", ".join("?" * len(row_ids))
+        cursor = self.conn.execute(
+            f"SELECT rowid AS _rowid, * FROM properties WHERE rowid IN ({placeholders})",
+            [int(row_id) for row_id in row_ids],
+        )
+        columns = [col[0] for col in cursor.description]
+        rows = {row[0]: dict(zip(columns[1:], row[1:])) for row in cursor.fetchall()}
 
+        matches = []
+        for row_id, distance in zip(row_ids, distances):
+            match = rows[int(row_id)]
+            for diff_col, col, value in zip(DIFF_COLUMNS, FEATURE_COLUMNS, features):
+                match[diff_col] = abs(float(match.get(col) or 0) - value)
+            match['total_diff'] = float(distance)
+            matches.append(match)
+        return matches
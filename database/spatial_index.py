@@ -0,0 +1,187 @@
+import threading
+import numpy as np
+from monitoring import metrics
+
+
+class FeatureIndex:
+    """
+    In-memory k-d tree over the model features of the properties table.
+
+    Distances are L1 (sum of absolute differences), optionally weighted per feature,
+    which matches the ranking used by the original SQL query. Ties are broken by the
+    most recent sale year, then by row id. Rows added after the tree was built are
+    kept in a small buffer that is scanned linearly until it is worth rebuilding.
+
+    The tree holds a permutation of the rows rather than a reordered copy, and leaves
+    gather their rows from the arrays it was given, so it can index memory-mapped
+    FeatureStore views without copying them.
+    """
+
+    def __init__(self, points, row_ids, years=None, leaf_size=64, store=None):
+        """
+        :param store: The FeatureStore the arrays are views of; the tree is then rebuilt
+                      from the store, instead of from a copy, once enough rows were added.
+        """
+        points = np.asarray(points)
+        if points.dtype not in (np.float32, np.float64):
+            points = points.astype(np.float64)
+        self.n_features = points.shape[1]
+        self.leaf_size = leaf_size
+        self.store = store
+        self._lock = threading.Lock()
+        self._build(
+            points,
+            np.asarray(row_ids, dtype=np.int64),
+            self._encode_years(years, len(row_ids)),
+        )
+
+    @classmethod
+    def from_store(cls, store, leaf_size=64):
+        """
+        Build an index over the memory-mapped views of a FeatureStore.
+        """
+        return cls(store.X, store.row_ids, store.years, leaf_size=leaf_size, store=store)
+
+    def __len__(self):
+        return len(self._row_ids) + len(self._pending_row_ids)
+
+    @staticmethod
+    def _encode_years(years, n):
+        # A missing sale year sorts last, as NULL does in "ORDER BY yrsold DESC"
+        if years is None:
+            return np.full(n, -np.inf)
+        years = np.asarray(years, dtype=np.float64).reshape(n)
+        missing = np.isnan(years)
+        return np.where(missing, -np.inf, years) if missing.any() else years
+
+    def _build(self, points, row_ids, years):
+        n = len(points)
+        order = np.arange(n)
+        dims, values, lefts, rights, starts, ends = [], [], [], [], [], []
+
+        def new_node(start, end):
+            dims.append(-1)
+            values.append(0.0)
+            lefts.append(-1)
+            rights.append(-1)
+            starts.append(start)
+            ends.append(end)
+            return len(starts) - 1
+
+        stack = [new_node(0, n)]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= self.leaf_size:
+                continue
+            idx = order[start:end]
+            block = points[idx]
+            spread = block.max(axis=0) - block.min(axis=0)
+            dim = int(spread.argmax())
+            if spread[dim] == 0:
+                continue  # Every point in this cell is identical
+            mid = (end - start) // 2
+            part = np.argpartition(block[:, dim], mid)
+            order[start:end] = idx[part]
+            # Points left of mid are <= value, points from mid onwards are >= value
+            dims[node] = dim
+            values[node] = float(block[part[mid], dim])
+            lefts[node] = new_node(start, start + mid)
+            rights[node] = new_node(start + mid, end)
+            stack.extend((lefts[node], rights[node]))
+
+        self._points, self._row_ids, self._years = points, row_ids, years
+        self._order = order
+        self._dims, self._values = dims, values
+        self._lefts, self._rights = lefts, rights
+        self._starts, self._ends = starts, ends
+        self._pending_points = np.empty((0, self.n_features))
+        self._pending_row_ids = np.empty(0, dtype=np.int64)
+        self._pending_years = np.empty(0)
+
+    def add(self, point, row_id, year=None):
+        """
+        Add a single row to the index.
+        """
+        point = np.asarray(point, dtype=np.float64).reshape(1, self.n_features)
+        with self._lock:
+            self._pending_points = np.vstack([self._pending_points, point])
+            self._pending_row_ids = np.append(self._pending_row_ids, row_id)
+            self._pending_years = np.append(self._pending_years, self._encode_years([year], 1))
+            if len(self._pending_row_ids) > max(16 * self.leaf_size, len(self._row_ids) // 16):
+                if self.store is not None and self.store.max_rowid >= self._pending_row_ids.max():
+                    self._build(self.store.X, self.store.row_ids, self._encode_years(self.store.years, len(self.store)))
+                else:
+                    self._build(
+                        np.vstack([self._points, self._pending_points]),
+                        np.concatenate([self._row_ids, self._pending_row_ids]),
+                        np.concatenate([self._years, self._pending_years]),
+                    )
+
+    def query(self, point, k=1, scale=None):
+        """
+        Find the k nearest rows to a point.
+        :param point: Feature values, in the same order the index was built with.
+        :param k: Number of matches to return.
+        :param scale: Optional per-feature weights applied to the absolute differences.
+        :return: A tuple (distances, row_ids) of NumPy arrays, nearest first.
+        """
+        q = np.asarray(point, dtype=np.float64).reshape(self.n_features)
+        w = np.ones(self.n_features) if scale is None else np.asarray(scale, dtype=np.float64).reshape(self.n_features)
+        best = []
+        scanned = 0
+        with self._lock:
+            if len(self._row_ids):
+                scanned += self._search(0, q, w, [0.0] * self.n_features, 0.0, best, k)
+            if len(self._pending_row_ids):
+                scanned += self._scan(self._pending_points, self._pending_row_ids, self._pending_years, q, w, best, k)
+        metrics.count("rows_scanned_total", scanned, operation="feature_index_query")
+        return (
+            np.array([dist for dist, _, _ in best]),
+            np.array([row_id for _, _, row_id in best], dtype=np.int64),
+        )
+
+    def _search(self, node, q, w, offsets, bound, best, k):
+        """
+        :return: The number of points compared against the query.
+        """
+        dim = self._dims[node]
+        if dim < 0:
+            rows = self._order[self._starts[node]:self._ends[node]]
+            return self._scan(self._points[rows], self._row_ids[rows], self._years[rows], q, w, best, k)
+
+        diff = q[dim] - self._values[node]
+        if diff < 0:
+            near, far = self._lefts[node], self._rights[node]
+        else:
+            near, far = self._rights[node], self._lefts[node]
+        scanned = self._search(near, q, w, offsets, bound, best, k)
+
+        # Lower bound on the distance to anything in the far cell
+        old_offset = offsets[dim]
+        new_offset = abs(diff) * w[dim]
+        far_bound = bound - old_offset + new_offset
+        if len(best) < k or far_bound <= best[-1][0]:
+            offsets[dim] = new_offset
+            scanned += self._search(far, q, w, offsets, far_bound, best, k)
+            offsets[dim] = old_offset
+        return scanned
+
+    @staticmethod
+    def _scan(points, row_ids, years, q, w, best, k):
+        dist = np.abs(points - q) @ w
+        if len(best) == k:
+            candidates = np.flatnonzero(dist <= best[-1][0])
+            if not candidates.size:
+                return len(dist)
+        else:
+            candidates = np.arange(len(dist))
+        if candidates.size > k:
+            ranked = np.lexsort((row_ids[candidates], -years[candidates], dist[candidates]))
+            candidates = candidates[ranked[:k]]
+        best.extend(
+            (float(dist[i]), -float(years[i]), int(row_ids[i])) for i in candidates
+        )
+        best.sort()
+        del best[k:]
+        return len(dist)
@@ -1,38 +1,224 @@
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 import pandas as pd
 
+# Model input features, in the order SalePriceModel expects them
+FEATURE_COLUMNS = [
+    'lotarea', 'overallqual', 'overallcond', 'centralair',
+    'fullbath', 'bedroomabvgr', 'garagecars'
+]
+
+
+def normalize_column_name(col):
+    """
+    Normalize a column name ("Lot Area" -> "lotarea").
+    """
+    return col.strip().replace(' ', '').replace('/', '').lower()
+
+
+def normalize_columns(df):
+    """
+    Normalize the column names of a DataFrame in place.
+    """
+    df.columns = [normalize_column_name(col) for col in df.columns]
+    return df
+
+
+def encode_feature_row(inputs):
+    """
+    Encode a single property's features, given in FEATURE_COLUMNS order, into a list of floats.
+    Central Air may be given as Y/N or already as 1/0; missing values become 0.
+    """
+    row = []
+    for col, value in zip(FEATURE_COLUMNS, inputs):
+        if value is None or value == 'N':
+            row.append(0.0)
+        elif col == 'centralair' and isinstance(value, str):
+            row.append(1.0 if value == 'Y' else 0.0)
+        else:
+            row.append(float(value))
+    return row
+
+
+def encode_features(df):
+    """
+    Encode the model features of a DataFrame into a contiguous float32 matrix.
+    Central Air may be given as Y/N or already as 1/0.
+    """
+    missing_columns = set(FEATURE_COLUMNS) - set(df.columns)
+    if missing_columns:
+        raise KeyError(f"Dataset is missing one or more required columns: {missing_columns}")
+
+    X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for i, col in enumerate(FEATURE_COLUMNS):
+        values = df[col]
+        if col == 'centralair' and not pd.api.types.is_numeric_dtype(values):
+            values = values.map({'Y': 1, 'N': 0})
+        X[:, i] = pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+    return X
+
+
+class FeatureScaler:
+    """
+    Standardizes model features and sale price targets.
+    The statistics are fitted in one vectorized pass and saved with the model weights,
+    so training and every prediction path scale inputs the same way.
+    """
+
+    def __init__(self, feature_mean=None, feature_std=None, target_mean=0.0, target_std=1.0):
+        self.feature_mean = None if feature_mean is None else np.asarray(feature_mean, dtype=np.float64)
+        self.feature_std = None if feature_std is None else np.asarray(feature_std, dtype=np.float64)
+        self.target_mean = float(target_mean)
+        self.target_std = float(target_std)
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        self.feature_mean = X.mean(axis=0)
+        self.feature_std = X.std(axis=0)
+        # Constant features (e.g. Central Air in a small sample) are left unscaled
+        self.feature_std[self.feature_std == 0] = 1.0
+        if y is not None:
+            y = np.asarray(y, dtype=np.float64)
+            self.target_mean = float(y.mean())
+            self.target_std = float(y.std()) or 1.0
+        return self
+
+    def fit_rows(self, X, y, rows, chunk_size=1_000_000):
+        """
+        Fit on the given rows of (possibly memory-mapped) arrays, a chunk at a time, so
+        the selected rows are never copied all at once.
+        """
+        rows = np.sort(rows)
+        n = len(rows)
+        sums = np.zeros(X.shape[1])
+        squares = np.zeros(X.shape[1])
+        y_sum = y_square = 0.0
+        for start in range(0, n, chunk_size):
+            chunk = rows[start:start + chunk_size]
+            X_chunk = np.asarray(X[chunk], dtype=np.float64)
+            y_chunk = np.asarray(y[chunk], dtype=np.float64)
+            sums += X_chunk.sum(axis=0)
+            squares += (X_chunk ** 2).sum(axis=0)
+            y_sum += y_chunk.sum()
+            y_square += (y_chunk ** 2).sum()
+        self.feature_mean = sums / n
+        self.feature_std = np.sqrt(np.maximum(squares / n - self.feature_mean ** 2, 0))
+        self.feature_std[self.feature_std == 0] = 1.0
+        self.target_mean = float(y_sum / n)
+        self.target_std = float(np.sqrt(max(y_square / n - self.target_mean ** 2, 0))) or 1.0
+        return self
+
+    def transform_features(self, X):
+        return ((np.asarray(X, dtype=np.float64) - self.feature_mean) / self.feature_std).astype(np.float32)
+
+    def transform_target(self, y):
+        return ((np.asarray(y, dtype=np.float64) - self.target_mean) / self.target_std).astype(np.float32)
+
+    def inverse_target(self, y):
+        return (np.asarray(y, dtype=np.float64) * self.target_std + self.target_mean).astype(np.float32)
+
+    def state_dict(self):
+        # Plain Python values only, as torch.load (weights_only) rejects NumPy scalars
+        return {
+            "feature_mean": [float(value) for value in self.feature_mean],
+            "feature_std": [float(value) for value in self.feature_std],
+            "target_mean": float(self.target_mean),
+            "target_std": float(self.target_std),
+        }
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        return cls(**state_dict)
+
+
 class HousingDataset(Dataset):
     def __init__(self, df):
         # Normalize column names
-        df.columns = [col.strip().replace(' ', '').replace('/', '').lower() for col in df.columns]
-
-        # Required columns
-        required_columns = [
-            'lotarea', 'overallqual', 'overallcond', 'centralair',
-            'fullbath', 'bedroomabvgr', 'garagecars'
-        ]
+        normalize_columns(df)
 
-        missing_columns = set(required_columns) - set(df.columns)
-        if missing_columns:
-            raise KeyError(f"Dataset is missing one or more required columns: {missing_columns}")
-
-        # Convert Central Air to numeric (Y -> 1, N -> 0)
-        if 'centralair' in df.columns:
-            df['centralair'] = df['centralair'].map({'Y': 1, 'N': 0}).fillna(0)
+        # Features and targets are encoded once into contiguous float32 arrays and
+        # shared with torch without copying
+        self.X = torch.from_numpy(encode_features(df))
+        self.y = (
+            torch.from_numpy(pd.to_numeric(df['saleprice'], errors='coerce').fillna(0).to_numpy(dtype=np.float32))
+            if 'saleprice' in df.columns else None
+        )
+        self.store, self.rows, self.scaler = None, None, None
 
-        # Ensure all columns are numeric
-        for col in required_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    @classmethod
+    def from_arrays(cls, X, y=None):
+        """
+        Build a dataset directly from an encoded feature matrix and optional targets.
+        """
+        dataset = cls.__new__(cls)
+        dataset.X = torch.from_numpy(np.ascontiguousarray(X, dtype=np.float32))
+        dataset.y = torch.from_numpy(np.ascontiguousarray(y, dtype=np.float32)) if y is not None else None
+        dataset.store, dataset.rows, dataset.scaler = None, None, None
+        return dataset
 
-        self.X = df[required_columns].values  # Features
-        self.y = df['saleprice'].fillna(0).values if 'saleprice' in df.columns else None
+    @classmethod
+    def from_store(cls, store, rows=None):
+        """
+        Build a dataset over some or all rows of a FeatureStore without copying them.
+        Mini-batches are gathered from the memory-mapped arrays, and scaled, one at a time.
+        :param rows: Indices of the store rows to use, by default every row.
+        """
+        dataset = cls.__new__(cls)
+        dataset.X, dataset.y = store.X, store.y
+        dataset.store = store
+        dataset.rows = np.arange(len(store)) if rows is None else np.asarray(rows)
+        dataset.scaler = None
+        return dataset
 
     def __len__(self):
-        return len(self.X)
+        return len(self.X) if self.store is None else len(self.rows)
 
     def __getitem__(self, idx):
-        return (
-            torch.tensor(self.X[idx], dtype=torch.float32),
-            torch.tensor(self.y[idx], dtype=torch.float32) if self.y is not None else None
-        )
+        if self.store is not None:
+            return self._gather(self.rows[idx])
+        return self.X[idx], self.y[idx] if self.y is not None else None
+
+    def scale(self, scaler):
+        """
+        Replace the stored features and targets with their scaled values.
+        A dataset over a FeatureStore keeps the scaler and scales each batch instead.
+        """
+        if self.store is not None:
+            self.scaler = scaler
+            return self
+        self.X = torch.from_numpy(scaler.transform_features(self.X.numpy()))
+        if self.y is not None:
+            self.y = torch.from_numpy(scaler.transform_target(self.y.numpy()))
+        return self
+
+    def _gather(self, rows):
+        X, y = np.asarray(self.X[rows], dtype=np.float32), np.asarray(self.y[rows], dtype=np.float32)
+        if self.scaler is not None:
+            X, y = self.scaler.transform_features(X), self.scaler.transform_target(y)
+        return torch.from_numpy(X), torch.from_numpy(y)
+
+    def batches(self, batch_size, shuffle=True, generator=None):
+        """
+        Yield (X, y) mini-batches without per-sample collation.
+        When shuffling, rows are permuted with a single gather per epoch and the
+        batches are then sliced from the permuted tensors as views. Datasets over a
+        FeatureStore gather each batch from the mapped arrays instead, so only one batch
+        is ever copied into memory.
+        """
+        if self.store is not None:
+            rows = self.rows
+            if shuffle:
+                rows = rows[torch.randperm(len(rows), generator=generator).numpy()]
+            for start in range(0, len(rows), batch_size):
+                # Sorted so that each batch reads the mapped pages in order
+                yield self._gather(np.sort(rows[start:start + batch_size]))
+            return
+
+        X, y = self.X, self.y
+        if shuffle:
+            order = torch.randperm(len(X), generator=generator)
+            X = X[order]
+            y = y[order] if y is not None else None
+        for start in range(0, len(X), batch_size):
+            yield X[start:start + batch_size], y[start:start + batch_size] if y is not None else None
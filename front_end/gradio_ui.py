@@ -1,8 +1,41 @@
 import gradio as gr
+from front_end.handler_pool import HandlerPool
+
+# Per-endpoint (max concurrent calls, max waiting calls) within the endpoint's pool.
+# An LLM customer profile holds an LLM thread for a whole generation, and writes contend
+# for the single SQLite writer, so neither may take a whole pool.
+ENDPOINT_LIMITS = {
+    "generate_customer_profiles": (1, 4),
+    "record_price": (2, 16),
+    "record_feedback": (2, 16),
+}
 
 class RealEstateAppUI:
-    def __init__(self, app):
+    def __init__(self, app, heavy_workers=None, heavy_queue=8, light_workers=8, light_queue=64, endpoint_limits=None):
+        """
+        :param heavy_workers: Threads for LLM handlers (listings, and customer profiles when
+                              the app generates them with the LLM). A request holds its thread
+                              while it waits for its micro-batch, so by default there is one per
+                              request the LLM handler's scheduler batches together (at least 2).
+        :param heavy_queue: LLM requests allowed to wait for a thread before new ones are rejected.
+        :param light_workers: Threads for prediction, closest match and recording handlers.
+        :param light_queue: Light requests allowed to wait for a thread before new ones are rejected.
+        :param endpoint_limits: Overrides ENDPOINT_LIMITS, keyed by RealEstateApp method name.
+        """
         self.app = app
+        if heavy_workers is None:
+            scheduler = getattr(app.llm_handler, "scheduler", None)
+            heavy_workers = max(2, scheduler.max_batch_size if scheduler is not None else 0)
+        # LLM calls run on their own pool so they can never starve the fast endpoints
+        self.heavy_pool = HandlerPool("llm", heavy_workers, heavy_queue, busy_error=gr.Error)
+        self.light_pool = HandlerPool("light", light_workers, light_queue, busy_error=gr.Error)
+        self.endpoint_limits = ENDPOINT_LIMITS if endpoint_limits is None else endpoint_limits
+
+    def light(self, fn):
+        return self.light_pool.wrap(fn, *self.endpoint_limits.get(fn.__name__, (None, 0)))
+
+    def heavy(self, fn):
+        return self.heavy_pool.wrap(fn, *self.endpoint_limits.get(fn.__name__, (None, 0)))
 
     def create_ui(self):
         with gr.Blocks() as demo:
@@ -21,7 +54,7 @@ class RealEstateAppUI:
                     ]
                     predicted_price = gr.Textbox(label="Predicted Price")
                     gr.Button("Predict").click(
-                        self.app.predict_price, inputs=estimation_inputs, outputs=predicted_price
+                        self.light(self.app.predict_price), inputs=estimation_inputs, outputs=predicted_price
                     )
 
                 with gr.Row():
@@ -31,7 +64,7 @@ class RealEstateAppUI:
                     ]
                     recorded_price = gr.Textbox(label="Recorded Price")
                     gr.Button("Record Sale").click(
-                        self.app.record_price, inputs=record_inputs, outputs=recorded_price
+                        self.light(self.app.record_price), inputs=record_inputs, outputs=recorded_price
                     )
 
             with gr.Tab("Sales Listing and Customer Profiling"):
@@ -46,14 +79,14 @@ class RealEstateAppUI:
                 ]
                 closest_match_output = gr.Textbox(label="Closest Match Property")
                 gr.Button("Query Closest Match").click(
-                    self.app.query_closest_match, inputs=query_inputs, outputs=closest_match_output
+                    self.light(self.app.query_closest_match), inputs=query_inputs, outputs=closest_match_output
                 )
 
                 with gr.Row():
                     description = gr.Textbox(label="Property Description")
                     listing_output = gr.Textbox(label="Generated Listing")
                     gr.Button("Generate Listing").click(
-                        self.app.generate_listing,
+                        self.heavy(self.app.generate_listing),
                         inputs=[*query_inputs, description],
                         outputs=listing_output,
                     )
@@ -62,17 +95,23 @@ class RealEstateAppUI:
                     feedback = gr.Radio(["Thumbs Up", "Thumbs Down"], label="Feedback")
                     feedback_output = gr.Textbox(label="Feedback Recorded")
                     gr.Button("Submit Feedback").click(
-                        self.app.record_feedback,
+                        self.light(self.app.record_feedback),
                         inputs=[listing_output, feedback],
                         outputs=feedback_output,
                     )
 
                 with gr.Row():
                     customer_profiles_output = gr.Textbox(label="Customer Profiles", lines=10)
+                    # Rule-based profiles take milliseconds, so only LLM profiles need the heavy pool
                     gr.Button("Generate Customer Profiles").click(
-                        self.app.generate_customer_profiles,
+                        self.heavy(self.app.generate_customer_profiles) if self.app.llm_profiles
+                        else self.light_pool.wrap(self.app.generate_customer_profiles),
                         inputs=query_inputs,
                         outputs=customer_profiles_output,
                     )
 
+        # The queue is needed to stream generator handlers such as generate_listing. Handlers
+        # are admitted without a Gradio concurrency limit because the pools bound them; the
+        # queue size only caps requests waiting for Gradio itself.
+        demo.queue(max_size=self.heavy_pool.max_queue + self.light_pool.max_queue, default_concurrency_limit=None)
         demo.launch()
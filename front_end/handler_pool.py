@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when a HandlerPool already holds as many requests as it accepts."""
+
+
+class HandlerPool:
+    """
+    Bounded worker pool for UI handlers.
+
+    Blocking handlers run on a dedicated ThreadPoolExecutor of `max_workers` threads and
+    are awaited from the event loop, so a slow handler never holds a thread another pool
+    needs. At most `max_workers + max_queue` requests are admitted at once; further ones
+    are rejected instead of waiting in an unbounded queue.
+    """
+
+    def __init__(self, name, max_workers, max_queue, busy_error=PoolBusyError):
+        """
+        :param busy_error: Exception class raised, with a message, for rejected requests.
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-handler")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.busy_error = busy_error
+        self.admitted = 0
+        self.rejected = 0
+
+    def _admit(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise self.busy_error(f"The {self.name} pool is busy, please try again shortly.")
+        with self._lock:
+            self.admitted += 1
+
+    async def run(self, fn, *args):
+        """
+        Run a blocking function on the pool and await its result.
+        """
+        self._admit()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._slots.release()
+
+    async def stream(self, fn, *args):
+        """
+        Run a blocking generator function on the pool, yielding its items as they come.
+        The request keeps its slot in the pool until the generator is exhausted.
+        """
+        self._admit()
+        done = object()
+        generator = fn(*args)
+        pending = None
+        try:
+            while True:
+                pending = self._executor.submit(next, generator, done)
+                item = await asyncio.wrap_future(pending)
+                if item is done:
+                    break
+                yield item
+        finally:
+            if pending is None:
+                self._close(generator)
+            else:
+                # A cancelled request (e.g. a disconnected client) may leave next() running
+                # on a worker; the generator can only be closed once that call returns.
+                # Callbacks of an already finished future run immediately
+                pending.add_done_callback(lambda _: self._close(generator))
+
+    def _close(self, generator):
+        try:
+            generator.close()
+        finally:
+            self._slots.release()
+
+    def wrap(self, fn, max_concurrency=None, max_queue=0):
+        """
+        Return an async handler (or async generator handler, for generator functions)
+        that dispatches `fn` to this pool.
+        :param max_concurrency: Optional limit on how many calls of this endpoint run at
+                                once, below the pool's own limit.
+        :param max_queue: With max_concurrency, how many more calls of this endpoint may
+                          wait before new ones are rejected.
+        """
+        if max_concurrency is None:
+            limit = contextlib.nullcontext
+        else:
+            slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+            running = asyncio.Semaphore(max_concurrency)
+
+            @contextlib.asynccontextmanager
+            async def limit():
+                if not slots.acquire(blocking=False):
+                    with self._lock:
+                        self.rejected += 1
+                    raise self.busy_error(f"Too many {fn.__name__} requests, please try again shortly.")
+                try:
+                    async with running:
+                        yield
+                finally:
+                    slots.release()
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            async def stream_handler(*args):
+                async with limit():
+                    async for item in self.stream(fn, *args):
+                        yield item
+            return stream_handler
+
+        @functools.wraps(fn)
+        async def handler(*args):
+            async with limit():
+                return await self.run(fn, *args)
+        return handler
+
+    def stats(self):
+        with self._lock:
+            return {"admitted": self.admitted, "rejected": self.rejected}
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -1,21 +1,48 @@
-import pandas as pd
+import argparse
+import atexit
+import time
+from concurrent.futures import ThreadPoolExecutor
 from database.init_db import DatabaseHandler
-from models.model import SalePriceModel
+from models.model import build_model
 from models.model_handler import ModelHandler
 from app.real_state_app import RealEstateApp
 from front_end.gradio_ui import RealEstateAppUI
-from models.llm_handler import LLMHandler
+from models.llm_handler import GENERATION_PROFILES, LLMHandler
+from models.response_cache import ResponseCache
+from training.online_training import IncrementalTrainer
+from monitoring import metrics
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def initialize_database(db_handler, data_path):
-    """Initialize the database with Ames Housing dataset."""
+def timed(phase, fn, *args):
+    """Run one startup phase and log how long it took."""
+    start = time.perf_counter()
+    result = fn(*args)
+    logging.info(f"Startup phase '{phase}' took {time.perf_counter() - start:.2f}s.")
+    return result
+
+def log_failure(phase):
+    """Future callback that logs a failed background startup phase."""
+    def callback(future):
+        if future.exception() is not None:
+            logging.error(f"Startup phase '{phase}' failed: {future.exception()}")
+    return callback
+
+def initialize_database(db_handler, data_path, rebuild=False):
+    """
+    Initialize the database with Ames Housing dataset unless it already holds the same data.
+    Returns the feature store holding the model columns, or None when the existing database was kept.
+    """
     try:
-        db_handler.initialize_database(data_path)
+        if not rebuild and db_handler.is_up_to_date(data_path):
+            logging.info("Database is up to date with the dataset, skipping the rebuild.")
+            return None
+        data = db_handler.initialize_database(data_path)
         logging.info("Database initialized successfully.")
-    except KeyError as e:
+        return data
+    except (KeyError, OSError, ValueError) as e:
         logging.error(f"Error initializing database: {e}")
         exit(1)
 
@@ -26,13 +53,26 @@ def initialize_model(model_handler, data, db_handler):
         logging.info("Model loaded successfully.")
     except (FileNotFoundError, EOFError):
         logging.warning("Model not found or invalid. Training a new model.")
+        if data is None:
+            # Trained in place from the memory-mapped feature store
+            data = db_handler.sync_feature_store()
         app = RealEstateApp(db_handler, model_handler, None)
         app.train_model(data)
 
-def initialize_llm_handler(hf_token):
-    """Initialize the LLM handler."""
+def initialize_feature_index(db_handler):
+    """Build the nearest-neighbour index when the database was not rebuilt."""
+    db_handler.feature_index = db_handler.build_feature_index()
+
+def initialize_llm_handler(hf_token, db_handler, profile="balanced"):
+    """
+    Initialize the LLM handler, caching responses in memory and in the listings table.
+    The model itself is loaded lazily, see LLMHandler.load.
+    """
     try:
-        llm_handler = LLMHandler(model_name="gpt2", token=hf_token)
+        llm_handler = LLMHandler(
+            model_name="gpt2", token=hf_token, cache=ResponseCache(db_handler=db_handler), max_batch_size=8,
+            lazy=True, profile=profile,
+        )
         logging.info("LLM Handler initialized successfully.")
         return llm_handler
     except Exception as e:
@@ -40,36 +80,65 @@ def initialize_llm_handler(hf_token):
         exit(1)
 
 if __name__ == "__main__":
-    # Data path
-    data_path = "data/ames_housing.csv"
+    parser = argparse.ArgumentParser(description="Real Estate Application")
+    parser.add_argument("--data", default="data/ames_housing.csv", help="Path to the Ames Housing CSV file")
+    parser.add_argument("--rebuild-db", action="store_true", help="Rebuild the database even if the dataset is unchanged")
+    parser.add_argument("--defer-llm", action="store_true", help="Load the LLM on the first request instead of at startup")
+    parser.add_argument("--generation-profile", choices=list(GENERATION_PROFILES), default="balanced",
+                        help="Listing generation profile, trading length and variety for latency")
+    parser.add_argument("--ensemble-members", type=int, default=1,
+                        help="Train an ensemble of this many networks, for prediction intervals, when no model is saved")
+    parser.add_argument("--llm-profiles", action="store_true",
+                        help="Generate customer profiles with the LLM instead of the rule-based generator")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Record metrics and serve them in Prometheus format at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--profile", metavar="OPERATION", default=None,
+                        help="Profile the first call of an instrumented operation, e.g. predict_price")
+    parser.add_argument("--profile-kind", choices=["cprofile", "torch"], default="cprofile")
+    args = parser.parse_args()
+    startup = time.perf_counter()
 
-    # Load the data
-    try:
-        data = pd.read_csv(data_path)
-        data.columns = [col.strip().replace(' ', '').replace('/', '').lower() for col in data.columns]
-        logging.info("Dataset loaded and normalized successfully.")
-    except Exception as e:
-        logging.error(f"Error loading dataset: {e}")
-        exit(1)
+    # Instrumentation stays off, and nearly free, unless asked for
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+        logging.info(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.profile:
+        logging.info(f"Profiling the next {args.profile} call to {metrics.profile_next(args.profile, kind=args.profile_kind)}")
 
-    # Initialize database
+    # Initialize database (the CSV is parsed once, here, and only when it changed)
     db_handler = DatabaseHandler()
-    initialize_database(db_handler, data_path)
-
-    # Initialize model and handler
-    model = SalePriceModel()
-    model_handler = ModelHandler(model, model_path="trained_model.pth")
-    initialize_model(model_handler, data, db_handler)
+    # Commit writes still waiting for the next batch before the process exits
+    atexit.register(db_handler.close)
+    data = timed("database", initialize_database, db_handler, args.data, args.rebuild_db)
 
     # Hugging Face token (replace with your token)
     hf_token = "your_huggingface_token"
 
-    # Initialize LLM Handler
-    llm_handler = initialize_llm_handler(hf_token)
+    # Initialize model, nearest-neighbour index and LLM concurrently
+    model = build_model(n_members=args.ensemble_members)
+    model_handler = ModelHandler(model, model_path="trained_model.pth")
+    llm_handler = initialize_llm_handler(hf_token, db_handler, args.generation_profile)
+
+    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+    model_ready = executor.submit(timed, "price model", initialize_model, model_handler, data, db_handler)
+    if db_handler.feature_index is None:
+        executor.submit(timed, "feature index", initialize_feature_index, db_handler).add_done_callback(
+            log_failure("feature index")
+        )
+    if not args.defer_llm:
+        executor.submit(timed, "LLM", llm_handler.load).add_done_callback(log_failure("LLM"))
+    executor.shutdown(wait=False)
+
+    # Predictions need the price model, so only that is waited for
+    model_ready.result()
+
+    # Fine-tune the model on newly recorded verified sales in the background
+    IncrementalTrainer(db_handler, model_handler).start()
 
     # Initialize app and UI
-    app = RealEstateApp(db_handler, model_handler, llm_handler)
+    app = RealEstateApp(db_handler, model_handler, llm_handler, llm_profiles=args.llm_profiles)
     ui = RealEstateAppUI(app)
 
     # Launch UI
+    logging.info(f"Launching UI {time.perf_counter() - startup:.2f}s after startup.")
     ui.create_ui()
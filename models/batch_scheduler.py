@@ -0,0 +1,74 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """
+    Micro-batching front end for LLM generation.
+
+    Prompts submitted from concurrent callers are collected for up to `max_wait`
+    seconds (or until `max_batch_size` are queued), run through `generate_fn` as one
+    batch on a single worker thread, and each result is routed back to its caller.
+    Callers may also stream their text as the batch generates it.
+    """
+
+    def __init__(self, generate_fn, max_batch_size=8, max_wait=0.02):
+        """
+        :param generate_fn: Callable taking a list of prompts and a list of per-prompt
+                            stream callbacks (None when not streamed), and returning a list of texts.
+        """
+        self.generate_fn = generate_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="llm-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt, stream=None):
+        """
+        Queue a prompt for generation.
+        :param stream: Optional callable receiving each new piece of generated text, from
+                       the scheduler thread, before the Future resolves.
+        :return: A Future resolving to the generated text.
+        """
+        future = Future()
+        self._queue.put((prompt, future, stream))
+        return future
+
+    def generate(self, prompt, timeout=None):
+        return self.submit(prompt).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Wait briefly for more prompts to share the forward passes with
+            try:
+                while len(batch) < self.max_batch_size:
+                    item = self._queue.get(timeout=self.max_wait)
+                    if item is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            prompts = [prompt for prompt, _, _ in batch]
+            streams = [stream for _, _, stream in batch]
+            try:
+                results = self.generate_fn(prompts, streams)
+            except Exception as e:
+                logging.error(f"Batched generation of {len(batch)} prompts failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from datasets.dataset import FEATURE_COLUMNS
+
+# Occupations in order of typical income, with the annual income each one starts at
+OCCUPATIONS = ("Retail Worker", "Teacher", "Nurse", "Engineer", "Manager", "Physician", "Executive")
+OCCUPATION_INCOME = (0, 40_000, 60_000, 80_000, 110_000, 150_000, 220_000)
+
+# Lifestyles in order, and the (noisy) overall condition each one starts at
+LIFESTYLES = ("Frugal", "Basic", "Comfortable", "Luxury")
+LIFESTYLE_CONDITION = (4, 6, 8)
+
+INTEREST_LEVELS = ("Low", "Moderate", "High")
+INTEREST_SCORE = (1.0, 2.0)
+
+# Buyers typically pay between 2.5 and 5 times their annual income for a home
+PRICE_TO_INCOME = (2.5, 5.0)
+MIN_INCOME = 20_000
+
+PROFILE_LABELS = {
+    "customer_id": "Customer ID",
+    "occupation": "Occupation",
+    "annual_income": "Annual Income",
+    "max_budget": "Max Budget",
+    "family_size": "Family Size",
+    "vehicles": "Vehicles",
+    "lifestyle": "Lifestyle",
+    "interest": "Interest in Property",
+}
+
+
+class CustomerProfileGenerator:
+    """
+    Rule-based generator of likely buyer profiles for properties.
+
+    Every attribute of every profile is drawn in one vectorized pass over all properties,
+    from distributions conditioned on the property: income follows the price, occupation
+    follows income, family size follows bedrooms, vehicles follow the garage, lifestyle
+    follows the condition, and interest reflects how well the property fits the buyer.
+    Results are deterministic for a given seed and input.
+    """
+
+    def __init__(self, profiles_per_property=5, seed=0):
+        self.profiles_per_property = profiles_per_property
+        self.seed = seed
+
+    def generate(self, X, prices, n=None):
+        """
+        Generate buyer profiles for many properties.
+        :param X: A float array of shape (m, 7), encoded as by datasets.dataset.encode_features.
+        :param prices: The (predicted or recorded) price of each property, shape (m,).
+        :param n: Profiles per property, by default profiles_per_property.
+        :return: A DataFrame with n rows per property, in property order, with a "property"
+                 column holding the row of X each profile belongs to.
+        """
+        n = self.profiles_per_property if n is None else n
+        X = np.asarray(X, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(FEATURE_COLUMNS):
+            raise ValueError(f"Expected features of shape (m, {len(FEATURE_COLUMNS)}), but got {X.shape}.")
+        if prices.shape != (len(X),):
+            raise ValueError(f"Expected {len(X)} prices, but got {prices.shape}.")
+
+        rng = np.random.default_rng(self.seed)
+        # One row per profile; each property's features repeated n times
+        rows = np.repeat(np.arange(len(X)), n)
+        quality, condition, central_air, bedrooms, garage = (
+            X[rows, FEATURE_COLUMNS.index(col)]
+            for col in ("overallqual", "overallcond", "centralair", "bedroomabvgr", "garagecars")
+        )
+        price = np.maximum(prices[rows], MIN_INCOME * PRICE_TO_INCOME[0])
+        size = len(rows)
+
+        price_to_income = rng.uniform(*PRICE_TO_INCOME, size)
+        income = np.maximum(price / price_to_income * rng.lognormal(0.0, 0.15, size), MIN_INCOME)
+        max_budget = income * PRICE_TO_INCOME[1]
+        occupation = np.searchsorted(OCCUPATION_INCOME, income * rng.lognormal(0.0, 0.2, size), side="right") - 1
+
+        bedrooms = np.clip(bedrooms, 0, 10).astype(np.int64)
+        family_size = np.clip(1 + rng.binomial(bedrooms + 1, 0.6), 1, 8)
+        vehicles = np.clip(np.clip(garage, 0, 4).astype(np.int64) + rng.integers(-1, 2, size), 0, 4)
+        lifestyle = np.searchsorted(LIFESTYLE_CONDITION, condition + rng.normal(0.0, 1.2, size), side="right")
+
+        # Better built homes that fit the household and its budget draw more interest
+        score = (
+            0.4 * (quality - 5)
+            + np.where(family_size <= bedrooms + 1, 1.0, -0.5)
+            + np.where(vehicles <= garage, 0.5, 0.0)
+            + np.where((central_air > 0) & (lifestyle >= 2), 0.5, 0.0)
+            + np.where(price <= max_budget * 0.8, 0.5, 0.0)
+            + rng.normal(0.0, 1.0, size)
+        )
+        interest = np.searchsorted(INTEREST_SCORE, score, side="right")
+
+        return pd.DataFrame({
+            "property": rows,
+            "customer_id": np.tile(np.arange(1, n + 1), len(X)),
+            "occupation": np.asarray(OCCUPATIONS)[occupation],
+            "annual_income": np.round(income, -2),
+            "max_budget": np.round(max_budget, -3),
+            "family_size": family_size,
+            "vehicles": vehicles,
+            "lifestyle": np.asarray(LIFESTYLES)[lifestyle],
+            "interest": np.asarray(INTEREST_LEVELS)[interest],
+        })
+
+    @staticmethod
+    def format(profiles):
+        """
+        Render the profiles of one property as readable text.
+        """
+        blocks = []
+        for profile in profiles.to_dict("records"):
+            lines = []
+            for key, label in PROFILE_LABELS.items():
+                value = profile[key]
+                if key == "customer_id":
+                    value = f"CUST-{value}"
+                elif key in ("annual_income", "max_budget"):
+                    value = f"${value:,.2f}"
+                lines.append(f"{label}: {value}")
+            blocks.append("\n".join(lines))
+        return "Generated Customer Profiles:\n" + "\n\n".join(blocks)
@@ -1,105 +1,459 @@
+import copy
+import math
 import os
-from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer
+import queue
+import threading
+import time
+import numpy as np
+import torch
+from datasets.dataset import FEATURE_COLUMNS, encode_feature_row
+from models.batch_scheduler import BatchScheduler
+from models.customer_profiles import CustomerProfileGenerator
+from models.response_cache import ResponseCache
+from monitoring import metrics
+
+LISTING_ERROR_PREFIX = "Error generating listing: "
+
+# Fixed start of every compact listing prompt; its keys and values are computed once
+# and reused by each request (see GENERATION_PROFILES "prefix_cache")
+LISTING_PROMPT_PREFIX = (
+    "You are a real estate copywriter. Write an upbeat, accurate sales listing for the "
+    "property below in one paragraph, mentioning its best features.\n\n"
+)
+
+# Properties columns named in compact prompts, most important first: column -> label
+LISTING_FIELDS = {
+    "neighborhood": "Neighborhood",
+    "housestyle": "Style",
+    "yearbuilt": "Year built",
+    "grlivarea": "Living area (sq ft)",
+    "lotarea": "Lot area (sq ft)",
+    "bedroomabvgr": "Bedrooms",
+    "fullbath": "Full baths",
+    "garagecars": "Garage (cars)",
+    "overallqual": "Overall quality (1-10)",
+    "overallcond": "Overall condition (1-10)",
+    "centralair": "Central air",
+    "kitchenqual": "Kitchen",
+    "halfbath": "Half baths",
+    "totalbsmtsf": "Basement (sq ft)",
+    "fireplaces": "Fireplaces",
+    "yearremodadd": "Remodeled",
+    "exterqual": "Exterior",
+    "garagetype": "Garage type",
+    "poolarea": "Pool (sq ft)",
+    "fence": "Fence",
+}
+
+# Ames quality codes spelled out for the model
+QUALITY_LABELS = {"Ex": "excellent", "Gd": "good", "TA": "average", "Fa": "fair", "Po": "poor"}
+
+# Generation profiles trading listing length and variety for latency:
+#   fields:             how many LISTING_FIELDS the prompt names
+#   description_words:  budget of the user's description (about 4 words to 3 tokens)
+#   generation:         decoding settings passed to generate (greedy or sampled, token budget)
+#   prefix_cache:       reuse the keys and values of LISTING_PROMPT_PREFIX across requests,
+#                       single and micro-batched
+#   stop:               stop generating once the listing ends with this terminator
+GENERATION_PROFILES = {
+    "fast": {
+        "fields": 9,
+        "description_words": 36,
+        "generation": {"max_new_tokens": 96, "do_sample": False, "repetition_penalty": 1.2},
+        "prefix_cache": True,
+        "stop": "\n\n",
+    },
+    "balanced": {
+        "fields": 14,
+        "description_words": 72,
+        "generation": {"max_new_tokens": 200, "do_sample": True, "temperature": 0.7, "top_p": 0.9},
+        "prefix_cache": True,
+        "stop": "\n\n",
+    },
+    "quality": {
+        "fields": len(LISTING_FIELDS),
+        "description_words": 144,
+        "generation": {
+            "max_new_tokens": 400, "do_sample": True, "temperature": 0.8, "top_p": 0.95, "repetition_penalty": 1.1,
+        },
+        "prefix_cache": True,
+        "stop": None,
+    },
+}
+
+
+class _BatchStreamer:
+    """
+    Streamer for a batched model.generate that routes each row's newly decoded text to
+    that row's callback (TextIteratorStreamer only handles a batch of one).
+    """
+
+    def __init__(self, tokenizer, streams):
+        self.tokenizer = tokenizer
+        self.streams = streams
+        self.tokens = [[] for _ in streams]
+        self.sent = [0] * len(streams)
+        self.prompt = True
+
+    def put(self, value):
+        # generate passes the prompt ids first, then one token per row and step
+        if self.prompt:
+            self.prompt = False
+            return
+        for i, token in enumerate(value.reshape(-1).tolist()):
+            if self.streams[i] is None:
+                continue
+            self.tokens[i].append(token)
+            text = self.tokenizer.decode(self.tokens[i], skip_special_tokens=True)
+            # An incomplete multi-byte character waits for its next token
+            if len(text) > self.sent[i] and not text.endswith("\ufffd"):
+                self.streams[i](text[self.sent[i]:])
+                self.sent[i] = len(text)
+
+    def end(self):
+        pass
 
 
 class LLMHandler:
-    def __init__(self, model_name="gpt2", token=None):
+    def __init__(self, model_name="gpt2", token=None, model=None, tokenizer=None, cache=None,
+                 max_batch_size=1, batch_wait=0.02, lazy=False, profile="balanced"):
+        """
+        :param model, tokenizer: Already constructed model and tokenizer to use instead of
+                                 loading `model_name` (e.g. a tiny local model).
+        :param cache: ResponseCache for generated text; an in-memory one is used by default.
+        :param max_batch_size: When above 1, concurrent requests are micro-batched by a
+                               BatchScheduler that waits up to `batch_wait` seconds.
+        :param lazy: Defer importing transformers and loading the model until `load` is
+                     called or the first request that needs the model arrives.
+        :param profile: Name of a GENERATION_PROFILES entry, or None for the original
+                        behaviour: the raw row in the prompt and up to 1000 sampled tokens.
+        """
         # Authenticate with Hugging Face if a token is provided
         if token:
             os.environ["HF_TOKEN"] = token
 
-        # Load model and tokenizer
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_auth_token=token)
-            self.model = AutoModelForCausalLM.from_pretrained(model_name, use_auth_token=token)
-            self.generator = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer)
-        except Exception as e:
-            raise EnvironmentError(
-                f"Failed to load model '{model_name}'. Ensure the model is valid and accessible. Error: {e}"
-            )
+        self.model_name = model_name
+        self.token = token
+        self.model = model
+        self.tokenizer = tokenizer
+        self.generator = None
+        self.cache = cache if cache is not None else ResponseCache()
+        self._load_lock = threading.Lock()
+        self.set_profile(profile)
+        self.scheduler = BatchScheduler(self.generate_batch, max_batch_size, batch_wait) if max_batch_size > 1 else None
 
-    def generate_listing_llm(self, features, description):
+        if not lazy:
+            self.load()
+
+    def load(self):
         """
-        Generate a real estate listing based on property features and a description.
+        Load the model and tokenizer if that has not happened yet. Safe to call from
+        several threads; later callers wait for the first load to finish.
         """
-        prompt = f"Generate a real estate listing with these features: {features}. Description: {description}."
-        try:
-            response = self.generator(
-                prompt,
-                max_new_tokens=1000,  # Generate up to 150 new tokens
-                num_return_sequences=1
-            )
-            return response[0]["generated_text"].strip()
-        except Exception as e:
-            return f"Error generating listing: {str(e)}"
+        if self.generator is not None:
+            return
+        with self._load_lock:
+            if self.generator is not None:
+                return
+            # Importing transformers alone takes seconds, so it only happens here
+            from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer
 
-    def generate_customer_profiles(self, features):
+            # Load model and tokenizer
+            try:
+                self.tokenizer = self.tokenizer or AutoTokenizer.from_pretrained(self.model_name, use_auth_token=self.token)
+                self.model = self.model or AutoModelForCausalLM.from_pretrained(self.model_name, use_auth_token=self.token)
+                if self.tokenizer.pad_token is None:
+                    self.tokenizer.pad_token = self.tokenizer.eos_token
+                self.generator = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer)
+            except Exception as e:
+                raise EnvironmentError(
+                    f"Failed to load model '{self.model_name}'. Ensure the model is valid and accessible. Error: {e}"
+                )
+
+    def set_profile(self, profile):
         """
-        Generate 5 realistic customer profiles for the property features provided.
+        Switch to another generation profile (see GENERATION_PROFILES), or None.
         """
-        try:
-            if len(features) < 7:
-                raise ValueError(f"Expected at least 7 input values, but got {len(features)}.")
-
-            # Extract relevant features for profile generation
-            lot_area, overall_quality, overall_condition, central_air, full_bath, bedrooms, garage_cars = features[:7]
-            price = features[-1]  # Assuming price is the last parameter
-
-            # Generate profiles based on inputs
-            profiles = []
-            for i in range(1, 6):
-                profile = {
-                    "Customer ID": f"CUST-{i}",
-                    "Occupation": self.get_occupation(overall_quality),
-                    "Annual Income": f"${self.estimate_income(price):,.2f}",
-                    "Family Size": self.estimate_family_size(bedrooms),
-                    "Lifestyle": self.get_lifestyle(overall_condition),
-                    "Interest in Property": "High" if overall_quality >= 7 else "Moderate",
-                }
-                profiles.append(profile)
-
-            # Format the output as a readable string
-            output = "Generated Customer Profiles:\n"
-            for profile in profiles:
-                output += "\n".join([f"{key}: {value}" for key, value in profile.items()]) + "\n\n"
-            return output.strip()
-        except Exception as e:
-            return f"Error generating customer profiles: {str(e)}"
+        if profile is not None and profile not in GENERATION_PROFILES:
+            raise ValueError(f"Unknown generation profile {profile!r}, expected one of {list(GENERATION_PROFILES)}.")
+        self.profile = profile
+        settings = GENERATION_PROFILES.get(profile, {})
+        # Decoding settings shared by the pipeline and the batched path (the pipeline's
+        # own defaults for text generation are sampling at temperature 0.7)
+        self.generation_kwargs = {"num_return_sequences": 1, **settings.get("generation", {
+            "max_new_tokens": 1000,
+            "do_sample": True,
+            "temperature": 0.7,
+        })}
+        self.stop = settings.get("stop")
+        self.prefix_cache = settings.get("prefix_cache", False)
+        self._prefix = None  # (input ids, past key values) of LISTING_PROMPT_PREFIX
+
+    @metrics.timed("llm_generate_batch")
+    def generate_batch(self, prompts, streams=None):
+        """
+        Generate completions for several prompts in one left-padded batch.
+        :param streams: Optional per-prompt callables (or None) receiving each new piece
+                        of that prompt's completion as it is generated.
+        :return: The generated texts, each including its prompt like the pipeline output.
+        """
+        self.load()
+        inputs = self._batch_inputs(prompts)
+        kwargs = self._decoding_kwargs()
+        if streams and any(stream is not None for stream in streams):
+            kwargs["streamer"] = _BatchStreamer(self.tokenizer, streams)
+        with torch.inference_mode():
+            outputs = self.model.generate(**inputs, **kwargs)
+        generated = outputs[:, inputs["input_ids"].shape[1]:]
+        metrics.count(
+            "tokens_generated_total", int((generated != self.tokenizer.pad_token_id).sum()), operation="llm_generate_batch"
+        )
+        completions = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        return [prompt + self._trim(completion) for prompt, completion in zip(prompts, completions)]
 
-    def get_occupation(self, overall_quality):
+    def _decoding_kwargs(self):
+        # generation_kwargs as accepted by model.generate rather than the pipeline
+        kwargs = {key: value for key, value in self.generation_kwargs.items() if key != "num_return_sequences"}
+        kwargs["pad_token_id"] = self.tokenizer.pad_token_id
+        if self.stop:
+            kwargs.update(stop_strings=[self.stop], tokenizer=self.tokenizer)
+        return kwargs
+
+    def _generate(self, prompt):
+        if self.scheduler is not None:
+            return self.scheduler.generate(prompt)
+        self.load()
+        if self.profile is not None:
+            inputs = self._prompt_inputs(prompt)
+            with torch.inference_mode():
+                outputs = self.model.generate(**inputs, **self._decoding_kwargs())
+            generated = outputs[0, inputs["input_ids"].shape[1]:]
+            metrics.count("tokens_generated_total", len(generated), operation="llm_generate")
+            return prompt + self._trim(self.tokenizer.decode(generated, skip_special_tokens=True))
+        text = self.generator(prompt, **self.generation_kwargs)[0]["generated_text"]
+        if metrics.enabled():
+            # The pipeline returns text only, so the completion is tokenized again to count it
+            completion = text[len(prompt):] if text.startswith(prompt) else text
+            metrics.count("tokens_generated_total", len(self.tokenizer(completion)["input_ids"]), operation="llm_generate")
+        return text
+
+    def _trim(self, completion):
+        # The stop string may arrive inside a longer token, so anything after it is cut
+        return completion.split(self.stop, 1)[0] if self.stop else completion
+
+    def _prompt_inputs(self, prompt):
         """
-        Map overall quality to an occupation type.
+        Tokenize a prompt for model.generate. When the prompt starts with the shared
+        prefix, a copy of the prefix's cached keys and values is passed along, so only
+        the request-specific tokens go through the model before decoding starts.
         """
-        if overall_quality >= 8:
-            return "Executive"
-        elif 6 <= overall_quality < 8:
-            return "Manager"
-        elif 4 <= overall_quality < 6:
-            return "Engineer"
-        else:
-            return "Retail Worker"
+        if not (self.prefix_cache and prompt.startswith(LISTING_PROMPT_PREFIX)):
+            return self.tokenizer(prompt, return_tensors="pt")
+        prefix_ids, past = self._prefix_state()
+        suffix_ids = self.tokenizer(prompt[len(LISTING_PROMPT_PREFIX):], return_tensors="pt")["input_ids"]
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+        # generate extends the cache in place, so every request gets its own copy
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": copy.deepcopy(past),
+        }
 
-    def estimate_income(self, price):
+    def _batch_inputs(self, prompts):
         """
-        Estimate annual income based on property price.
+        Tokenize prompts for a batched model.generate, left-padded. When every prompt
+        starts with the shared prefix, the padding goes between the prefix and the rest
+        instead: the prefix then sits at the same positions in every row, so its cached
+        keys and values are repeated over the batch, and the masked padding leaves the
+        positions of the other tokens as they would be in an unpadded prompt.
         """
-        return price * 0.3  # Assume income is approximately 30% of property price
+        self.tokenizer.padding_side = "left"
+        if not (self.prefix_cache and all(prompt.startswith(LISTING_PROMPT_PREFIX) for prompt in prompts)):
+            return self.tokenizer(prompts, return_tensors="pt", padding=True)
+        prefix_ids, past = self._prefix_state()
+        suffixes = self.tokenizer(
+            [prompt[len(LISTING_PROMPT_PREFIX):] for prompt in prompts], return_tensors="pt", padding=True
+        )
+        n = len(prompts)
+        past = copy.deepcopy(past)
+        past.batch_repeat_interleave(n)
+        return {
+            "input_ids": torch.cat([prefix_ids.expand(n, -1), suffixes["input_ids"]], dim=1),
+            "attention_mask": torch.cat([torch.ones(n, prefix_ids.shape[1], dtype=torch.long), suffixes["attention_mask"]], dim=1),
+            "past_key_values": past,
+        }
 
-    def estimate_family_size(self, bedrooms):
+    def _prefix_state(self):
         """
-        Estimate family size based on the number of bedrooms.
+        :return: The input ids of LISTING_PROMPT_PREFIX and its keys and values, computed
+                 on first use. Callers must copy the cache before generating from it.
         """
-        return min(bedrooms + 1, 6)  # Cap family size at 6 for simplicity
+        if self._prefix is None:
+            with self._load_lock:
+                if self._prefix is None:
+                    prefix_ids = self.tokenizer(LISTING_PROMPT_PREFIX, return_tensors="pt")["input_ids"]
+                    with torch.inference_mode():
+                        past = self.model(prefix_ids, use_cache=True).past_key_values
+                    self._prefix = (prefix_ids, past)
+        return self._prefix
 
-    def get_lifestyle(self, overall_condition):
+    def listing_prompt(self, features, description):
         """
-        Map overall condition to a lifestyle category.
+        :param features: The property, as a dict of properties columns (see
+                         DatabaseHandler.get_full_data_for_features), a tuple of the seven
+                         model features, or any other value, which is included as is.
         """
-        if overall_condition >= 8:
-            return "Luxury"
-        elif 6 <= overall_condition < 8:
-            return "Comfortable"
-        elif 4 <= overall_condition < 6:
-            return "Basic"
-        else:
-            return "Frugal"
+        if self.profile is None:
+            return f"Generate a real estate listing with these features: {features}. Description: {description}."
+        settings = GENERATION_PROFILES[self.profile]
+        # Long descriptions are cut to the profile's budget. Words rather than tokens, so
+        # that prompts (and their cache keys) can be built before the tokenizer is loaded
+        words = str(description or "").split()
+        description = " ".join(words[:settings["description_words"]])
+        lines = [f"{label}: {value}" for label, value in self.compact_features(features, settings["fields"])]
+        if description:
+            lines.append(f"Agent notes: {description}")
+        return LISTING_PROMPT_PREFIX + "\n".join(lines) + "\n\nListing:"
+
+    @staticmethod
+    def compact_features(features, n_fields=len(LISTING_FIELDS)):
+        """
+        Select the first n_fields LISTING_FIELDS present in a property.
+        :return: A list of (label, formatted value) pairs; missing values are skipped.
+        """
+        if isinstance(features, (tuple, list)) and len(features) == len(FEATURE_COLUMNS):
+            features = dict(zip(FEATURE_COLUMNS, features))
+        if not isinstance(features, dict):
+            return [("Property", str(features))]
+        fields = []
+        for col, label in list(LISTING_FIELDS.items())[:n_fields]:
+            value = features.get(col)
+            if value is None or value == "" or (isinstance(value, float) and math.isnan(value)):
+                continue
+            if col == "centralair":
+                value = "yes" if value in (1, "1", "Y") else "no"
+            elif isinstance(value, str):
+                value = QUALITY_LABELS.get(value, value)
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            fields.append((label, value))
+        return fields
+
+    def listing_cache_key(self, features, description):
+        """
+        Cache key of the listing generated for these features and description.
+        """
+        params = dict(self.generation_kwargs, stop=self.stop) if self.stop else self.generation_kwargs
+        return self.cache.make_key(self.listing_prompt(features, description), model=self.model_name, **params)
+
+    @metrics.timed("generate_listing_llm")
+    def generate_listing_llm(self, features, description):
+        """
+        Generate a real estate listing based on property features and a description.
+        Responses are served from the cache when the same prompt was generated before.
+        """
+        prompt = self.listing_prompt(features, description)
+        key = self.listing_cache_key(features, description)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            listing = self._generate(prompt).strip()
+        except Exception as e:
+            return f"{LISTING_ERROR_PREFIX}{str(e)}"
+        self.cache.put(key, listing)
+        return listing
+
+    def stream_listing_llm(self, features, description):
+        """
+        Generate a real estate listing like generate_listing_llm, yielding the text
+        generated so far as tokens are decoded. The last value yielded is the full listing.
+        With a scheduler, the request is generated in a micro-batch with concurrent ones.
+        """
+        key = self.listing_cache_key(features, description)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        try:
+            self.load()
+        except Exception as e:
+            yield f"{LISTING_ERROR_PREFIX}{str(e)}"
+            return
+        from transformers import TextIteratorStreamer
+
+        prompt = self.listing_prompt(features, description)
+        if self.scheduler is not None:
+            yield from self._stream_batched(prompt, key)
+            return
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+        start = time.perf_counter()
+
+        def run():
+            try:
+                inputs = self._prompt_inputs(prompt)
+                with torch.inference_mode():
+                    outputs = self.model.generate(**inputs, **self._decoding_kwargs(), streamer=streamer)
+                metrics.count(
+                    "tokens_generated_total", outputs.shape[1] - inputs["input_ids"].shape[1],
+                    operation="stream_listing_llm",
+                )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=run, name="llm-stream", daemon=True)
+        thread.start()
+        text = prompt
+        for new_text in streamer:
+            text += new_text
+            yield text
+        thread.join()
+        if metrics.enabled():
+            metrics.REGISTRY.record_call("stream_listing_llm", time.perf_counter() - start, failed=bool(errors))
+
+        if errors:
+            yield f"{LISTING_ERROR_PREFIX}{str(errors[0])}"
+            return
+        listing = (prompt + self._trim(text[len(prompt):])).strip()
+        self.cache.put(key, listing)
+        yield listing
+
+    def _stream_batched(self, prompt, key):
+        chunks = queue.Queue()
+        end = object()
+        start = time.perf_counter()
+        future = self.scheduler.submit(prompt, stream=chunks.put)
+        # Every chunk is queued before the batch's futures resolve
+        future.add_done_callback(lambda _: chunks.put(end))
+        text = prompt
+        for chunk in iter(chunks.get, end):
+            text += chunk
+            yield text
+        error = future.exception()
+        if metrics.enabled():
+            metrics.REGISTRY.record_call("stream_listing_llm", time.perf_counter() - start, failed=error is not None)
+        if error is not None:
+            yield f"{LISTING_ERROR_PREFIX}{str(error)}"
+            return
+        # generate_batch has already cut the completion at the stop string
+        listing = future.result().strip()
+        self.cache.put(key, listing)
+        yield listing
+
+    def generate_customer_profiles(self, features):
+        """
+        Generate 5 realistic customer profiles for the property features provided.
+        The profiles come from the rule-based CustomerProfileGenerator, not the LLM.
+        :param features: The seven property features followed by the price.
+        """
+        try:
+            if len(features) < 8:
+                raise ValueError(f"Expected 7 features and a price, but got {len(features)} values.")
+            X = np.array([encode_feature_row(features[:7])])
+            profiles = CustomerProfileGenerator().generate(X, [float(features[-1])])
+            return CustomerProfileGenerator.format(profiles)
+        except Exception as e:
+            return f"Error generating customer profiles: {str(e)}"
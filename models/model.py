@@ -1,15 +1,68 @@
+import torch
 import torch.nn as nn
 
 class SalePriceModel(nn.Module):
-    def __init__(self):
+    # Predictions have one column per member, like SalePriceEnsemble's
+    n_members = 1
+
+    def __init__(self, hidden_sizes=(64, 32), n_features=7):
         super(SalePriceModel, self).__init__()
-        self.fc = nn.Sequential(
-            nn.Linear(7, 64),
-            nn.ReLU(),
-            nn.Linear(64, 32),
-            nn.ReLU(),
-            nn.Linear(32, 1)
-        )
+        self.hidden_sizes = tuple(hidden_sizes)
+        layers = []
+        in_features = n_features
+        for size in self.hidden_sizes:
+            layers += [nn.Linear(in_features, size), nn.ReLU()]
+            in_features = size
+        layers.append(nn.Linear(in_features, 1))
+        self.fc = nn.Sequential(*layers)
 
     def forward(self, x):
         return self.fc(x)
+
+
+class SalePriceEnsemble(nn.Module):
+    """
+    K independently initialized SalePriceModel networks stored as stacked weights.
+
+    Layer i of every member is one (K, in, out) tensor, so all members are evaluated in
+    a single batched matmul per layer rather than K separate forward passes, and are
+    trained together by one optimizer (their parameters never interact).
+    """
+
+    def __init__(self, n_members=5, hidden_sizes=(64, 32), n_features=7):
+        super(SalePriceEnsemble, self).__init__()
+        self.n_members = n_members
+        self.hidden_sizes = tuple(hidden_sizes)
+        sizes = (n_features,) + self.hidden_sizes + (1,)
+        self.weights = nn.ParameterList()
+        self.biases = nn.ParameterList()
+        for in_features, out_features in zip(sizes[:-1], sizes[1:]):
+            # Same initialization as nn.Linear, drawn separately for every member
+            bound = in_features ** -0.5
+            self.weights.append(nn.Parameter(torch.empty(n_members, in_features, out_features).uniform_(-bound, bound)))
+            self.biases.append(nn.Parameter(torch.empty(n_members, 1, out_features).uniform_(-bound, bound)))
+
+    def forward(self, x):
+        """
+        :param x: Features of shape (n, n_features).
+        :return: One prediction per member, shape (n, n_members).
+        """
+        # Slicing a ParameterList builds a new module, so the layers are read into plain lists
+        weights, biases = list(self.weights), list(self.biases)
+        k, in_features, out_features = weights[0].shape
+        # The first layer of all members is one (n, in) @ (in, K * out) matmul, viewed as
+        # (K, n, out). Only its columns are split, since a traced module must not depend on n
+        first = weights[0].permute(1, 0, 2).reshape(in_features, k * out_features)
+        x = torch.addmm(biases[0].reshape(-1), x, first).unflatten(1, (k, out_features)).transpose(0, 1)
+        for i in range(1, len(weights)):
+            x = torch.baddbmm(biases[i], torch.relu(x), weights[i])
+        return x.squeeze(2).t()
+
+
+def build_model(hidden_sizes=(64, 32), n_members=1):
+    """
+    A SalePriceModel, or a SalePriceEnsemble of n_members networks when n_members > 1.
+    """
+    if n_members > 1:
+        return SalePriceEnsemble(n_members, hidden_sizes)
+    return SalePriceModel(hidden_sizes)
@@ -1,15 +1,81 @@
+import copy
 import os
+import threading
+from statistics import NormalDist
+import numpy as np
 import torch
+import torch.nn as nn
+from datasets.dataset import FEATURE_COLUMNS, FeatureScaler
+from models.model import SalePriceEnsemble, build_model
+from models.numpy_model import NumpySalePriceModel
+from monitoring import metrics
+
+# Formats accepted by export_inference_model
+INFERENCE_MODES = ("torchscript", "quantized", "numpy")
+
+# Coverage of the prediction intervals returned by predict_interval
+INTERVAL_LEVEL = 0.9
+
+# Rows per forward pass of an ensemble, whose activations are n_members times wider;
+# small enough that they stay in the CPU cache
+ENSEMBLE_BATCH_SIZE = 1024
+
+class _Standardize(nn.Module):
+    def __init__(self, mean, std):
+        super(_Standardize, self).__init__()
+        self.register_buffer("mean", torch.tensor(mean, dtype=torch.float32))
+        self.register_buffer("std", torch.tensor(std, dtype=torch.float32))
+
+    def forward(self, x):
+        return (x - self.mean) / self.std
 
 class ModelHandler:
     def __init__(self, model, model_path="trained_model.pth"):
         self.model = model
         self.model_path = model_path
+        # FeatureScaler the weights were trained with; None for unscaled (older) models
+        self.scaler = None
+        # Standard deviation, in dollars, of the model's errors on held-out sales (see
+        # training.model_training.residual_std); None when it was never measured
+        self.residual_std = None
+        # Optimized artifact loaded by load_inference_model; predictions use it when set
+        self.inference_model = None
+        # Row id of the last verified sale the weights have been trained on
+        self.last_verified_rowid = 0
+        # Bumped whenever the served weights change, so cached predictions can be invalidated
+        self.version = 0
+        self._lock = threading.Lock()
 
     def save_model(self):
-        torch.save(self.model.state_dict(), self.model_path)
+        checkpoint = {
+            "model_state_dict": self.model.state_dict(),
+            "last_verified_rowid": self.last_verified_rowid,
+            "scaler": self.scaler.state_dict() if self.scaler is not None else None,
+            "hidden_sizes": list(self.model.hidden_sizes),
+            "n_members": self.model.n_members,
+            "residual_std": self.residual_std,
+        }
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        tmp_path = f"{self.model_path}.tmp"
+        torch.save(checkpoint, tmp_path)
+        os.replace(tmp_path, self.model_path)
+        self.version += 1
         print(f"Model saved to {self.model_path}")
 
+    def swap_model(self, model, last_verified_rowid=None):
+        """
+        Atomically replace the served model with new weights and save them.
+        Callers that already hold a reference to the old model keep using it.
+        """
+        model.eval()
+        with self._lock:
+            self.model = model
+            # An exported artifact would still hold the old weights
+            self.inference_model = None
+            if last_verified_rowid is not None:
+                self.last_verified_rowid = last_verified_rowid
+            self.save_model()
+
     def load_model(self):
         """
         Load the model state dictionary from the saved file.
@@ -20,8 +86,27 @@ class ModelHandler:
                 if os.path.getsize(self.model_path) == 0:
                     raise EOFError(f"The model file at {self.model_path} is empty.")
 
-                self.model.load_state_dict(torch.load(self.model_path))
+                checkpoint = torch.load(self.model_path)
+                # Older checkpoints hold a bare state dict
+                if "model_state_dict" in checkpoint:
+                    # Checkpoints written by a hyperparameter sweep may use other layer sizes,
+                    # and ensemble checkpoints hold several members
+                    hidden_sizes = tuple(checkpoint.get("hidden_sizes", self.model.hidden_sizes))
+                    n_members = checkpoint.get("n_members", 1)
+                    if hidden_sizes != self.model.hidden_sizes or n_members != self.model.n_members:
+                        self.model = build_model(hidden_sizes, n_members)
+                    self.model.load_state_dict(checkpoint["model_state_dict"])
+                    self.last_verified_rowid = checkpoint.get("last_verified_rowid", 0)
+                    self.residual_std = checkpoint.get("residual_std")
+                    scaler = checkpoint.get("scaler")
+                    self.scaler = FeatureScaler.from_state_dict(scaler) if scaler is not None else None
+                else:
+                    self.model.load_state_dict(checkpoint)
+                    self.scaler = None
+                    self.residual_std = None
                 self.model.eval()
+                self.inference_model = None
+                self.version += 1
                 print(f"Model loaded from {self.model_path}")
             except EOFError as e:
                 raise EOFError(f"Failed to load model from {self.model_path}. The file might be corrupted or incomplete.") from e
@@ -29,3 +114,152 @@ class ModelHandler:
                 raise RuntimeError(f"Error loading model state_dict: {e}")
         else:
             raise FileNotFoundError(f"Model file not found at path: {self.model_path}")
+
+    def export_inference_model(self, path, mode="torchscript"):
+        """
+        Export the current weights as an inference-only artifact. Feature and target
+        scaling are folded into the weights, so artifacts take raw features and return prices.
+        :param mode: "torchscript" (traced and frozen module), "quantized" (Linear layers
+                     dynamically quantized to int8, then traced and frozen) or "numpy"
+                     (an .npz of the weights for NumpySalePriceModel). Ensembles can only be
+                     exported with "torchscript".
+        """
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{mode}', expected one of {INFERENCE_MODES}.")
+        if isinstance(self.model, SalePriceEnsemble) and mode != "torchscript":
+            raise ValueError(f"Ensembles can only be exported with mode 'torchscript', not '{mode}'.")
+
+        if mode == "numpy":
+            state_dict = {key: value.detach().cpu().numpy() for key, value in self._folded_model().state_dict().items()}
+            NumpySalePriceModel.from_state_dict(state_dict).save(path)
+        else:
+            # Several rows, so that nothing traced depends on a batch of one
+            example = torch.zeros(4, len(FEATURE_COLUMNS))
+            if mode == "quantized":
+                # int8 activations cannot represent raw features of very different magnitudes,
+                # so inputs are standardized explicitly in front of the quantized layers
+                model = torch.ao.quantization.quantize_dynamic(
+                    self._folded_model(fold_inputs=False), {nn.Linear}, dtype=torch.qint8
+                )
+                if self.scaler is not None:
+                    model = nn.Sequential(_Standardize(self.scaler.feature_mean, self.scaler.feature_std), model)
+            else:
+                model = self._folded_model()
+            # A batch of another size, with realistic feature values, to check the traced module against
+            batch = torch.randn(7, len(FEATURE_COLUMNS))
+            if self.scaler is not None:
+                batch = batch * torch.tensor(self.scaler.feature_std, dtype=torch.float32) + torch.tensor(
+                    self.scaler.feature_mean, dtype=torch.float32
+                )
+            with torch.inference_mode():
+                scripted = torch.jit.freeze(torch.jit.trace(model.eval(), example))
+                expected, exported = model(batch), scripted(batch)
+            if exported.shape != expected.shape or not torch.allclose(exported, expected, rtol=1e-4, atol=1e-2):
+                raise RuntimeError(f"The exported {mode} model does not reproduce the model on a batch of {len(batch)} rows.")
+            torch.jit.save(scripted, path)
+        print(f"Inference model ({mode}) exported to {path}")
+
+    def _folded_model(self, fold_inputs=True):
+        """
+        A copy of the model with the scaler folded into its first and last Linear layers.
+        """
+        model = copy.deepcopy(self.model).eval()
+        if self.scaler is None:
+            return model
+        mean = torch.tensor(self.scaler.feature_mean, dtype=torch.float32)
+        std = torch.tensor(self.scaler.feature_std, dtype=torch.float32)
+        if isinstance(model, SalePriceEnsemble):
+            # Stacked (K, in, out) weights, applied as x @ W + b
+            with torch.no_grad():
+                if fold_inputs:
+                    model.biases[0] -= torch.matmul(mean / std, model.weights[0]).unsqueeze(1)
+                    model.weights[0] /= std[:, None]
+                model.weights[-1] *= self.scaler.target_std
+                model.biases[-1].mul_(self.scaler.target_std).add_(self.scaler.target_mean)
+            return model
+        first, last = model.fc[0], model.fc[-1]
+        with torch.no_grad():
+            if fold_inputs:
+                # W (x - mean) / std + b == (W / std) x + (b - W (mean / std))
+                first.bias -= first.weight @ (mean / std)
+                first.weight /= std
+            last.weight *= self.scaler.target_std
+            last.bias.mul_(self.scaler.target_std).add_(self.scaler.target_mean)
+        return model
+
+    def load_inference_model(self, path):
+        """
+        Load an artifact written by export_inference_model and serve predictions from it.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Inference model not found at path: {path}")
+        if path.endswith(".npz"):
+            self.inference_model = NumpySalePriceModel.load(path)
+        else:
+            self.inference_model = torch.jit.load(path)
+        self.version += 1
+        print(f"Inference model loaded from {path}")
+
+    @metrics.timed("model_predict")
+    def predict(self, X, batch_size=65536):
+        """
+        Predict prices for a feature matrix. An ensemble predicts the mean of its members.
+        :param X: A float32 array of shape (n, 7), such as a memory-mapped FeatureStore view.
+                  It is scaled a batch at a time, so it is never copied as a whole.
+        :return: A float32 NumPy array with one price per row.
+        """
+        prices = np.empty(len(X), dtype=np.float32)
+        scaler = None
+        for start, members, scaler in self._member_predictions(X, batch_size):
+            prices[start:start + len(members)] = members.mean(axis=1)
+        return scaler.inverse_target(prices) if scaler is not None else prices
+
+    @metrics.timed("model_predict_interval")
+    def predict_interval(self, X, level=INTERVAL_LEVEL, batch_size=65536):
+        """
+        Predict prices with prediction intervals for a feature matrix.
+        The spread of a price combines the disagreement between ensemble members (none for
+        a single model) with residual_std, and its interval is the normal interval of that
+        spread around the mean.
+        :param level: Probability that a sale price falls inside its interval.
+        :return: A dict of float32 arrays with one value per row: "price" (the member mean),
+                 "std", "lower" and "upper".
+        """
+        z = NormalDist().inv_cdf(0.5 + level / 2)
+        prices = np.empty(len(X), dtype=np.float32)
+        spread = np.zeros(len(X), dtype=np.float32)
+        scaler = None
+        for start, members, scaler in self._member_predictions(X, batch_size):
+            prices[start:start + len(members)] = members.mean(axis=1)
+            if members.shape[1] > 1:
+                spread[start:start + len(members)] = members.std(axis=1, ddof=1)
+        if scaler is not None:
+            prices = scaler.inverse_target(prices)
+            spread *= scaler.target_std
+        std = np.sqrt(spread.astype(np.float64) ** 2 + (self.residual_std or 0.0) ** 2).astype(np.float32)
+        return {"price": prices, "std": std, "lower": prices - z * std, "upper": prices + z * std}
+
+    def _member_predictions(self, X, batch_size):
+        """
+        Run the served model (or artifact) over X a batch at a time.
+        :return: A generator of (start row, predictions of shape (batch, members), scaler);
+                 the predictions are still standardized when scaler is not None.
+        """
+        # Exported artifacts have the scaling folded in
+        if self.inference_model is not None:
+            model, scaler = self.inference_model, None
+        else:
+            model, scaler = self.model, self.scaler
+        if self.model.n_members > 1:
+            batch_size = min(batch_size, ENSEMBLE_BATCH_SIZE)
+        with torch.inference_mode():
+            for start in range(0, len(X), batch_size):
+                batch = np.ascontiguousarray(X[start:start + batch_size], dtype=np.float32)
+                if scaler is not None:
+                    batch = scaler.transform_features(batch)
+                elif not batch.flags.writeable:
+                    batch = batch.copy()  # torch cannot wrap a read-only mapping
+                if isinstance(model, NumpySalePriceModel):
+                    yield start, model(batch), scaler
+                else:
+                    yield start, model(torch.from_numpy(batch)).numpy(), scaler
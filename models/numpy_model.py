@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class NumpySalePriceModel:
+    """
+    SalePriceModel's forward pass in pure NumPy: the Linear layers as matmuls with ReLU
+    in between. This module does not import torch, so a process that only serves
+    predictions from an exported .npz file never loads it.
+    """
+
+    def __init__(self, weights, biases):
+        # Weights are stored transposed, (in, out), so the forward pass is X @ W + b
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        """
+        Build from a SalePriceModel state dict whose values are NumPy arrays.
+        """
+        names = sorted(
+            (key[:-len(".weight")] for key in state_dict if key.endswith(".weight")),
+            key=lambda name: int(name.rsplit(".", 1)[1]),
+        )
+        return cls(
+            [np.asarray(state_dict[f"{name}.weight"]).T for name in names],
+            [state_dict[f"{name}.bias"] for name in names],
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            n_layers = len([key for key in f.files if key.startswith("weight_")])
+            return cls([f[f"weight_{i}"] for i in range(n_layers)], [f[f"bias_{i}"] for i in range(n_layers)])
+
+    def save(self, path):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = w
+            arrays[f"bias_{i}"] = b
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    def __call__(self, X):
+        """
+        :param X: Feature matrix of shape (n, 7).
+        :return: Predictions of shape (n, 1).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            X = X @ w + b
+            if i < last:
+                np.maximum(X, 0, out=X)
+        return X
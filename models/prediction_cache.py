@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+
+from datasets.dataset import encode_feature_row
+from monitoring import metrics
+
+
+class PredictionCache:
+    """
+    LRU cache for per-property results such as price predictions and closest matches.
+
+    Keys are the encoded seven-feature tuple, so "Y" and 1, or 3 and 3.0, share an entry.
+    Each entry remembers the version of the data it was computed from (see
+    ModelHandler.version and DatabaseHandler.version) and counts as a miss once that
+    version has moved on.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Time the cached computations took, summed over every hit
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(namespace, inputs):
+        """
+        Build a cache key from an endpoint name and its raw feature inputs.
+        """
+        return (namespace, tuple(encode_feature_row(inputs)))
+
+    def get_or_compute(self, key, version, compute):
+        """
+        Return the cached value for a key computed at `version`, or call compute() and cache it.
+        """
+        hit = invalidated = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version:
+                value, _, seconds = entry
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += seconds
+                hit = True
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                    self.invalidations += 1
+                    invalidated = True
+                self.misses += 1
+        # Exported as metrics too, outside the cache lock
+        if hit:
+            metrics.count("cache_hits_total", cache="prediction")
+            metrics.count("cache_saved_seconds_total", seconds, cache="prediction")
+            return value
+        if invalidated:
+            metrics.count("cache_invalidations_total", cache="prediction")
+        metrics.count("cache_misses_total", cache="prediction")
+
+        start = time.perf_counter()
+        value = compute()
+        seconds = time.perf_counter() - start
+        if self.max_size > 0:
+            with self._lock:
+                self._entries[key] = (value, version, seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return hit/miss counters, the time saved by hits and the current number of entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "size": len(self._entries),
+            }
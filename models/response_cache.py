@@ -0,0 +1,93 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from monitoring import metrics
+
+
+class ResponseCache:
+    """
+    LRU cache for LLM responses with a size bound and a time-to-live.
+
+    Keys are derived from the normalized prompt and the generation parameters. When a
+    DatabaseHandler is given, misses fall back to the listings table, where
+    RealEstateApp.generate_listing records every listing under its prompt key.
+    """
+
+    def __init__(self, max_size=256, ttl=24 * 3600, db_handler=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_handler = db_handler
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, **params):
+        """
+        Build a cache key from a prompt and the parameters used to generate from it.
+        Whitespace differences in the prompt do not produce different keys.
+        """
+        normalized = " ".join(str(prompt).split())
+        payload = json.dumps({"prompt": normalized, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if self.ttl is None or now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.count("cache_hits_total", cache="response", tier="memory")
+                    return value
+                del self._entries[key]
+
+        if self.db_handler is not None:
+            value = self.db_handler.get_cached_listing(key, max_age=self.ttl)
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.persistent_hits += 1
+                metrics.count("cache_hits_total", cache="response", tier="database")
+                return value
+
+        with self._lock:
+            self.misses += 1
+        metrics.count("cache_misses_total", cache="response")
+        return None
+
+    def put(self, key, value):
+        self._store(key, value, time.time())
+
+    def _store(self, key, value, created_at):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current number of in-memory entries.
+        """
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
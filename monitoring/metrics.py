@@ -0,0 +1,305 @@
+import bisect
+import contextlib
+import cProfile
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Metric families: name -> (Prometheus type, help text)
+METRICS = {
+    "latency_seconds": ("histogram", "Latency of instrumented operations."),
+    "calls_total": ("counter", "Calls of instrumented operations."),
+    "errors_total": ("counter", "Calls of instrumented operations that raised."),
+    "rows_scanned_total": ("counter", "Rows read or examined by an operation."),
+    "tokens_generated_total": ("counter", "Tokens generated by the LLM."),
+    "cache_hits_total": ("counter", "Lookups answered by a cache."),
+    "cache_misses_total": ("counter", "Lookups a cache could not answer."),
+    "cache_invalidations_total": ("counter", "Cache entries dropped because their data version moved on."),
+    "cache_saved_seconds_total": ("counter", "Compute time saved by cache hits, in seconds."),
+}
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and histograms, labelled by operation, that renders
+    itself in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def record_call(self, operation, seconds, failed=False):
+        """
+        Record one call of an operation: its latency, the call and whether it raised.
+        """
+        labels = (("operation", operation),)
+        with self._lock:
+            histogram = self._histograms.get(("latency_seconds", labels))
+            if histogram is None:
+                histogram = self._histograms[("latency_seconds", labels)] = Histogram()
+            histogram.observe(seconds)
+            key = ("calls_total", labels)
+            self._counters[key] = self._counters.get(key, 0) + 1
+            if failed:
+                key = ("errors_total", labels)
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def value(self, name, **labels):
+        """
+        Return the current value of a counter (0 if it was never incremented).
+        """
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text) in METRICS.items():
+                counters = sorted((labels, value) for (key, labels), value in self._counters.items() if key == name)
+                histograms = sorted(
+                    ((labels, histogram) for (key, labels), histogram in self._histograms.items() if key == name),
+                    key=lambda item: item[0],
+                )
+                if not counters and not histograms:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in counters:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                for labels, histogram in histograms:
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+# Instrumented calls go straight to the wrapped function unless metrics are enabled or
+# a profile is armed, so disabled instrumentation costs one global lookup per call
+_enabled = False
+_active = False
+_armed_profiles = {}  # operation -> (kind, path)
+_profile_lock = threading.Lock()
+
+
+def _update_active():
+    global _active
+    _active = _enabled or bool(_armed_profiles)
+
+
+def enable():
+    global _enabled
+    _enabled = True
+    _update_active()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    _update_active()
+
+
+def enabled():
+    return _enabled
+
+
+def count(name, value=1, **labels):
+    """
+    Add to a counter, such as rows_scanned_total or tokens_generated_total.
+    """
+    if _enabled:
+        REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if _enabled:
+        REGISTRY.observe(name, value, **labels)
+
+
+@contextlib.contextmanager
+def track(operation):
+    """
+    Record the latency, call count and errors of the enclosed block under an operation name.
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        REGISTRY.record_call(operation, time.perf_counter() - start, failed)
+
+
+def timed(operation):
+    """
+    Decorator recording a function's latency, call count and errors under an operation
+    name, and running it under a profiler when a profile was armed with profile_next.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return fn(*args, **kwargs)
+            profile = None
+            if _armed_profiles:
+                with _profile_lock:
+                    profile = _armed_profiles.pop(operation, None)
+                    _update_active()
+            if profile is not None:
+                return _profiled(profile, operation, fn, args, kwargs)
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                REGISTRY.record_call(operation, time.perf_counter() - start, failed)
+        return wrapper
+    return decorator
+
+
+def profile_next(operation, path=None, kind="cprofile"):
+    """
+    Profile the next call of an instrumented operation and write the trace to a file.
+    :param kind: "cprofile" for a pstats file (open with `python -m pstats`), or "torch"
+                 for a Chrome trace from torch.profiler (open in chrome://tracing).
+    :return: The path the trace will be written to.
+    """
+    if kind not in ("cprofile", "torch"):
+        raise ValueError(f"Unknown profiler {kind!r}, expected 'cprofile' or 'torch'.")
+    if path is None:
+        path = os.path.join("profiles", f"{operation}-{int(time.time())}.{'prof' if kind == 'cprofile' else 'json'}")
+    with _profile_lock:
+        _armed_profiles[operation] = (kind, path)
+        _update_active()
+    return path
+
+
+def _profiled(profile, operation, fn, args, kwargs):
+    kind, path = profile
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with track(operation):
+        if kind == "torch":
+            import torch
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as prof:
+                result = fn(*args, **kwargs)
+            prof.export_chrome_trace(path)
+        else:
+            profiler = cProfile.Profile()
+            try:
+                result = profiler.runcall(fn, *args, **kwargs)
+            finally:
+                profiler.dump_stats(path)
+    print(f"Profile of {operation} written to {path}")
+    return result
+
+
+def dump(path=None):
+    """
+    Return the metrics in Prometheus text format, also writing them to a file if a path is given.
+    """
+    text = REGISTRY.render()
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._reply(200, dump(), "text/plain; version=0.0.4")
+        elif url.path == "/profile":
+            # /profile?operation=predict_price&kind=cprofile arms a profile of the next call
+            params = parse_qs(url.query)
+            try:
+                path = profile_next(params["operation"][0], kind=params.get("kind", ["cprofile"])[0])
+                self._reply(200, f"Profiling the next call, trace will be written to {path}\n")
+            except (KeyError, ValueError) as e:
+                self._reply(400, f"Bad profile request: {e}\n")
+        else:
+            self._reply(404, "Not found\n")
+
+    def _reply(self, status, body, content_type="text/plain"):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise flood the application log
+
+
+def serve(port=9100, host="127.0.0.1"):
+    """
+    Enable metrics and serve them at http://host:port/metrics from a daemon thread.
+    GET /profile?operation=NAME[&kind=torch] profiles the next call of an operation.
+    :return: The running ThreadingHTTPServer; call shutdown() on it to stop.
+    """
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
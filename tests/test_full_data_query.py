@@ -0,0 +1,68 @@
+"""
+get_full_data_for_features must seek the (feature, yrsold) indexes rather than scan
+properties, and return what the original seven-way OR query returned.
+"""
+import pandas as pd
+import pytest
+
+from database.init_db import FULL_DATA_QUERY, DatabaseHandler
+from datasets.dataset import FEATURE_COLUMNS
+
+ORIGINAL_QUERY = """
+SELECT * FROM properties
+WHERE lotarea = ? OR overallqual = ? OR overallcond = ? OR centralair = ?
+OR fullbath = ? OR bedroomabvgr = ? OR garagecars = ?
+ORDER BY yrsold DESC, rowid LIMIT 1
+"""
+
+# Rows 3 and 4 were sold in the same year and share several feature values, so lookups
+# that match both are decided by the row id
+PROPERTIES = pd.DataFrame({
+    "LotArea": [8450, 9600, 11250, 9550, 14260, 14115],
+    "OverallQual": [7, 6, 7, 7, 8, 5],
+    "OverallCond": [5, 8, 5, 5, 5, 5],
+    "CentralAir": ["Y", "Y", "Y", "N", "Y", "Y"],
+    "FullBath": [2, 2, 2, 1, 2, 1],
+    "BedroomAbvGr": [3, 3, 3, 3, 4, 1],
+    "GarageCars": [2, 2, 2, 3, 3, 2],
+    "YrSold": [2008, 2007, 2010, 2010, 2008, 2009],
+    "SalePrice": [208500, 181500, 223500, 140000, 250000, 143000],
+})
+
+QUERIES = [
+    (8450, 7, 5, 1, 2, 3, 2),  # every feature of row 1, which is not the latest sale
+    (9600, -1, -1, -1, -1, -1, -1),  # only the lot area of row 2
+    (-1, -1, -1, 0, -1, -1, -1),  # only central air, which row 4 alone lacks
+    (-1, 5, -1, -1, -1, 1, -1),  # only features of row 6
+    (-1, -1, -1, -1, -1, -1, -1),  # nothing
+]
+
+
+@pytest.fixture
+def db_handler(tmp_path):
+    csv_path = tmp_path / "properties.csv"
+    PROPERTIES.to_csv(csv_path, index=False)
+    db_handler = DatabaseHandler(str(tmp_path / "properties.db"))
+    db_handler.initialize_database(str(csv_path))
+    yield db_handler
+    db_handler.close()
+
+
+def test_query_plan_uses_feature_indexes(db_handler):
+    plan = [row[3] for row in db_handler.conn.execute("EXPLAIN QUERY PLAN " + FULL_DATA_QUERY, (0,) * 7)]
+    assert not [step for step in plan if step.startswith("SCAN properties")], plan
+    for col in FEATURE_COLUMNS:
+        assert any(f"INDEX idx_properties_{col}_yrsold " in step for step in plan), (col, plan)
+
+
+@pytest.mark.parametrize("features", QUERIES)
+def test_matches_original_query(db_handler, features):
+    expected = db_handler.conn.execute(ORIGINAL_QUERY, features).fetchone()
+    assert db_handler.get_full_data_for_features(features) == expected
+
+
+def test_ties_go_to_the_lowest_row_id(db_handler):
+    # Rows 3 and 4 both match on overall quality and were both sold in 2010
+    row = db_handler.get_full_data_for_features((-1, 7, -1, -1, -1, -1, -1), as_dict=True)
+    assert (row["lotarea"], row["yrsold"]) == (11250, 2010)
+    assert db_handler.get_full_data_for_features(QUERIES[-1]) is None
@@ -1,25 +1,250 @@
-from models.model import SalePriceModel
-from datasets.dataset import HousingDataset
-from torch.utils.data import DataLoader
+import argparse
+import copy
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import torch
 import torch.optim as optim
 import torch.nn as nn
-import torch
+from models.model import SalePriceModel, build_model
+from models.model_handler import ModelHandler
+from database.feature_store import FeatureStore
+from datasets.dataset import HousingDataset, FeatureScaler
+from monitoring import metrics
+
+# Hyperparameters searched by run_sweep when no grid is given
+DEFAULT_GRID = {
+    "lr": [0.0003, 0.001, 0.003],
+    "batch_size": [32, 128],
+    "epochs": [50],
+    "hidden_sizes": [(64, 32), (128, 64)],
+}
 
-def train_and_save_model(data, model_path="trained_model.pth", epochs=10, batch_size=32, lr=0.001):
-    dataset = HousingDataset(data)
-    train_loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
 
-    model = SalePriceModel()  # Ensure this matches the updated feature count
+def fit(model, dataset, epochs=10, batch_size=32, lr=0.001, val_dataset=None, patience=None, generator=None):
+    """
+    Train a model in place on a (scaled) HousingDataset.
+    The members of an ensemble are trained together, each on its own squared error, and
+    validation scores their mean prediction. With a validation set, the weights of the
+    epoch with the lowest validation loss are restored at the end, and training stops
+    early once `patience` epochs pass without improvement.
+    :return: A dict with the number of epochs run and the best validation loss (or None).
+    """
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(), lr=lr)
+    best_loss, best_state, stale_epochs = None, None, 0
+    epochs_run = 0
+
+    model.train()
+    for _ in range(epochs):
+        epochs_run += 1
+        with metrics.track("training_epoch"):
+            for batch_X, batch_y in dataset.batches(batch_size, shuffle=True, generator=generator):
+                optimizer.zero_grad()
+                predictions = model(batch_X)
+                # Summed over members, so each one gets the gradient it would get alone
+                loss = criterion(predictions, batch_y[:, None].expand_as(predictions)) * model.n_members
+                loss.backward()
+                optimizer.step()
+        metrics.count("rows_scanned_total", len(dataset), operation="training_epoch")
+
+        if val_dataset is None:
+            continue
+        with torch.inference_mode():
+            val_loss = criterion(model(val_dataset.X).mean(1), val_dataset.y).item()
+        if best_loss is None or val_loss < best_loss:
+            best_loss, best_state, stale_epochs = val_loss, copy.deepcopy(model.state_dict()), 0
+        else:
+            stale_epochs += 1
+            if patience is not None and stale_epochs >= patience:
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return {"epochs": epochs_run, "val_loss": best_loss}
+
+
+def split_dataset(data, val_fraction=0.2, seed=0):
+    """
+    Encode a DataFrame, hold out a random validation split and standardize both splits
+    with a FeatureScaler fitted on the training split only.
+    :param data: A DataFrame, or a FeatureStore whose training split is then read in
+                 place, batch by batch (the validation split is copied into memory).
+    :return: (scaler, train_dataset, val_dataset); val_dataset is None when val_fraction is 0.
+    """
+    if isinstance(data, FeatureStore):
+        order = np.random.default_rng(seed).permutation(len(data))
+        n_val = int(len(data) * val_fraction)
+        val_idx, train_idx = np.sort(order[:n_val]), np.sort(order[n_val:])
+        scaler = FeatureScaler().fit_rows(data.X, data.y, train_idx)
+        train_dataset = HousingDataset.from_store(data, train_idx).scale(scaler)
+        val_dataset = HousingDataset.from_arrays(data.X[val_idx], data.y[val_idx]).scale(scaler) if n_val else None
+        return scaler, train_dataset, val_dataset
+
+    dataset = HousingDataset(data)
+    X, y = dataset.X.numpy(), dataset.y.numpy()
+    order = np.random.default_rng(seed).permutation(len(X))
+    n_val = int(len(X) * val_fraction)
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    scaler = FeatureScaler().fit(X[train_idx], y[train_idx])
+    train_dataset = HousingDataset.from_arrays(X[train_idx], y[train_idx]).scale(scaler)
+    val_dataset = HousingDataset.from_arrays(X[val_idx], y[val_idx]).scale(scaler) if n_val else None
+    return scaler, train_dataset, val_dataset
+
+
+def residual_std(model, dataset, target_std=1.0, batch_size=65536):
+    """
+    Root mean squared error of the (ensemble mean) predictions on a scaled dataset,
+    the spread of sale prices around them that prediction intervals account for.
+    :param target_std: The scaler's target_std, to report the error in dollars.
+    """
+    squared_error = 0.0
+    with torch.inference_mode():
+        for batch_X, batch_y in dataset.batches(batch_size, shuffle=False):
+            squared_error += float(((model(batch_X).mean(1) - batch_y) ** 2).sum())
+    return float(np.sqrt(squared_error / max(len(dataset), 1)) * target_std)
+
+
+def train_and_save_model(data, model_path="trained_model.pth", epochs=10, batch_size=32, lr=0.001, n_members=1,
+                         val_fraction=0.0):
+    """
+    :param n_members: Train an ensemble of this many networks instead of a single one.
+    :param val_fraction: Rows held out to measure the residual_std of prediction intervals;
+                         with 0 it is measured on the training rows.
+    """
+    # Features and prices are standardized; the scaler is saved with the weights
+    scaler, dataset, val_dataset = split_dataset(data, val_fraction=val_fraction)
 
-    for epoch in range(epochs):
-        for batch_X, batch_y in train_loader:
-            optimizer.zero_grad()
-            predictions = model(batch_X).squeeze()
-            loss = criterion(predictions, batch_y)
-            loss.backward()
-            optimizer.step()
+    model = build_model(n_members=n_members)
+    fit(model, dataset, epochs=epochs, batch_size=batch_size, lr=lr)
 
-    torch.save(model.state_dict(), model_path)
+    model_handler = ModelHandler(model, model_path=model_path)
+    model_handler.scaler = scaler
+    model_handler.residual_std = residual_std(model, val_dataset or dataset, scaler.target_std)
+    model_handler.save_model()
     print(f"Model retrained and saved to {model_path}")
+
+
+def sweep_trials(grid=None, n_trials=None, seed=0):
+    """
+    Expand a hyperparameter grid into trials.
+    :param n_trials: When set, a random search over that many points of the grid.
+    """
+    grid = grid or DEFAULT_GRID
+    keys = sorted(grid)
+    trials = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    if n_trials is not None and n_trials < len(trials):
+        picks = np.random.default_rng(seed).choice(len(trials), size=n_trials, replace=False)
+        trials = [trials[i] for i in picks]
+    return trials
+
+
+# Training data of a sweep worker process, set once by _init_sweep_worker
+_worker_data = None
+
+
+def _init_sweep_worker(num_threads, arrays):
+    global _worker_data
+    # Capped so that workers do not oversubscribe the cores between them
+    torch.set_num_threads(num_threads)
+    _worker_data = arrays
+
+
+def _run_trial(trial, patience, seed):
+    train, X_val, y_val, target_std = _worker_data
+    torch.manual_seed(seed)
+    if isinstance(train[0], str):
+        # (store path, row indices, scaler state): every worker maps the same files
+        store_path, rows, scaler_state = train
+        train_dataset = HousingDataset.from_store(FeatureStore(store_path, read_only=True), rows)
+        train_dataset.scale(FeatureScaler.from_state_dict(scaler_state))
+    else:
+        train_dataset = HousingDataset.from_arrays(*train)
+    val_dataset = HousingDataset.from_arrays(X_val, y_val)
+    model = build_model(trial["hidden_sizes"], trial.get("n_members", 1))
+
+    start = time.perf_counter()
+    history = fit(
+        model, train_dataset, epochs=trial["epochs"], batch_size=trial["batch_size"], lr=trial["lr"],
+        val_dataset=val_dataset, patience=patience, generator=torch.Generator().manual_seed(seed),
+    )
+    return {
+        **trial,
+        "epochs_run": history["epochs"],
+        # Validation RMSE back in dollars
+        "val_rmse": float(np.sqrt(history["val_loss"]) * target_std),
+        "seconds": time.perf_counter() - start,
+        "state_dict": model.state_dict(),
+    }
+
+
+def run_sweep(data, grid=None, n_trials=None, val_fraction=0.2, patience=5, processes=None,
+              threads_per_worker=1, seed=0, model_handler=None):
+    """
+    Train one model per hyperparameter trial across a process pool and pick the one with
+    the lowest validation RMSE.
+    :param data: A DataFrame, or a FeatureStore that the workers then map instead of
+                 each receiving a copy of the training split.
+    :param grid: Lists of values per hyperparameter, DEFAULT_GRID by default; an
+                 "n_members" entry also searches ensemble sizes.
+    :param processes: Worker processes; defaults to the number of CPU cores.
+    :param model_handler: When given, the best model and its scaler are saved through it.
+    :return: The trial results sorted by validation RMSE, best first (without weights).
+    """
+    scaler, train_dataset, val_dataset = split_dataset(data, val_fraction=val_fraction, seed=seed)
+    if val_dataset is None:
+        raise ValueError("A hyperparameter sweep needs a validation split, val_fraction must be above 0.")
+    if train_dataset.store is not None:
+        train = (data.path, train_dataset.rows, scaler.state_dict())
+    else:
+        train = (train_dataset.X.numpy(), train_dataset.y.numpy())
+    arrays = (train, val_dataset.X.numpy(), val_dataset.y.numpy(), scaler.target_std)
+    trials = sweep_trials(grid, n_trials, seed)
+    processes = processes or multiprocessing.cpu_count()
+
+    # Spawned rather than forked workers, as forking after torch has started threads can deadlock
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(trials)), mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_sweep_worker, initargs=(threads_per_worker, arrays),
+    ) as executor:
+        results = list(executor.map(_run_trial, trials, itertools.repeat(patience), itertools.repeat(seed)))
+    results.sort(key=lambda result: result["val_rmse"])
+
+    best = results[0]
+    if model_handler is not None:
+        model = build_model(best["hidden_sizes"], best.get("n_members", 1))
+        model.load_state_dict(best["state_dict"])
+        model.eval()
+        model_handler.model = model
+        model_handler.scaler = scaler
+        # The validation RMSE is the spread of held-out prices around the predictions
+        model_handler.residual_std = best["val_rmse"]
+        model_handler.inference_model = None
+        model_handler.save_model()
+    return [{key: value for key, value in result.items() if key != "state_dict"} for result in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for the sale price model")
+    parser.add_argument("--data", default="data/ames_housing.csv")
+    parser.add_argument("--feature-store", default=None,
+                        help="Train from a FeatureStore directory (e.g. real_estate.db.features) instead of --data")
+    parser.add_argument("--model-path", default="trained_model.pth")
+    parser.add_argument("--trials", type=int, default=None, help="Random search over this many grid points")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--patience", type=int, default=5)
+    args = parser.parse_args()
+
+    data = FeatureStore(args.feature_store, read_only=True) if args.feature_store else pd.read_csv(args.data)
+    results = run_sweep(
+        data, n_trials=args.trials, patience=args.patience, processes=args.processes,
+        threads_per_worker=args.threads_per_worker, model_handler=ModelHandler(SalePriceModel(), args.model_path),
+    )
+    for result in results:
+        print(result)
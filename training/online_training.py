@@ -0,0 +1,80 @@
+import copy
+import logging
+import threading
+import pandas as pd
+from datasets.dataset import HousingDataset
+from training.model_training import fit
+
+
+class IncrementalTrainer:
+    """
+    Fine-tune the served SalePriceModel on verified sales recorded since the last checkpoint.
+
+    New rows are mixed with a random replay sample of older rows so the model does not
+    drift towards the handful of fresh sales. Training runs on a copy of the model and
+    the result is swapped into the ModelHandler in one step, so predictions are never
+    blocked or served from half-updated weights.
+    """
+
+    def __init__(self, db_handler, model_handler, interval=300, replay_size=1024, min_new_rows=1,
+                 epochs=5, batch_size=32, lr=0.0001):
+        self.db_handler = db_handler
+        self.model_handler = model_handler
+        self.interval = interval
+        self.replay_size = replay_size
+        self.min_new_rows = min_new_rows
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.lr = lr
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update_once(self):
+        """
+        Run a single incremental update.
+        :return: The number of new verified sales trained on (0 if there was nothing to do).
+        """
+        last_rowid = self.model_handler.last_verified_rowid
+        max_rowid = self.db_handler.conn.execute("SELECT MAX(rowid) FROM properties").fetchone()[0] or 0
+        if last_rowid > max_rowid:
+            # The properties table was rebuilt since the checkpoint was written
+            last_rowid = 0
+
+        new_rows = self.db_handler.get_verified_sales(after_rowid=last_rowid)
+        if len(new_rows) < self.min_new_rows:
+            return 0
+
+        replay = self.db_handler.sample_properties(self.replay_size, max_rowid=int(new_rows['rowid'].min()) - 1)
+        dataset = HousingDataset(pd.concat([new_rows, replay], ignore_index=True))
+        # Keep the scaling the served weights were trained with
+        if self.model_handler.scaler is not None:
+            dataset.scale(self.model_handler.scaler)
+
+        model = copy.deepcopy(self.model_handler.model)
+        fit(model, dataset, epochs=self.epochs, batch_size=self.batch_size, lr=self.lr)
+
+        self.model_handler.swap_model(model, last_verified_rowid=int(new_rows['rowid'].max()))
+        logging.info(f"Model updated with {len(new_rows)} new verified sales and {len(replay)} replayed rows.")
+        return len(new_rows)
+
+    def start(self):
+        """
+        Run update_once every `interval` seconds in a background daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="incremental-trainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update_once()
+            except Exception as e:
+                logging.error(f"Incremental model update failed: {e}")